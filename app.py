@@ -3,25 +3,28 @@ Book Translator - Streamlit App
 Translates illustrated books from English to Hebrew.
 """
 
+import itertools
 import logging
+import math
+import os
+import statistics
+import string
 import time
-import traceback
 import streamlit as st
 
 # Configure logging
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=os.environ.get("LOG_LEVEL", "INFO").upper(),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
-from database import get_stats, get_verification_issues, get_failed_pages, log_error
-from translator import process_single_page
-from batch import submit_batch_job, check_batch_status, process_batch_results
+# Third-party loggers are chatty at DEBUG (one line per image chunk / HTTP request)
+logging.getLogger("PIL").setLevel(logging.WARNING)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+from database import get_stats, get_verification_issues, get_failed_pages, log_error, reset_database
 from utils import (
-    load_image_from_upload,
-    create_zip_in_memory,
-    get_output_filename,
     sort_files_naturally,
     estimate_processing_time,
     validate_uploaded_files,
@@ -29,10 +32,13 @@ from utils import (
     get_phase_icon,
     get_phase_label,
     UploadProgress,
-    extract_images_from_zip,
     stream_images_from_zip,
+    stream_images_from_uploads,
     count_images_in_zip,
     TempResultStorage,
+    TempPageStorage,
+    BATCH_DECODE_WORKERS,
+    PageResultCache,
 )
 
 
@@ -223,91 +229,132 @@ PROGRESS_CSS = """
 """
 
 
-def render_progress_component(progress: UploadProgress, current_filename: str = "") -> str:
-    """
-    Render the mobile-friendly progress component as HTML.
-
-    Args:
-        progress: UploadProgress object with current state
-        current_filename: Name of the file currently being processed
-
-    Returns:
-        HTML string for the progress component
-    """
-    # Calculate SVG circle parameters
-    radius = 60
-    circumference = 2 * 3.14159 * radius
-    progress_offset = circumference - (progress.overall_progress / 100) * circumference
-
-    # Calculate batch bar width
-    batch_pct = progress.batch_progress
-
-    # Build batch chips HTML
-    batch_chips = ""
-    if progress.total_batches > 1:
-        # Show max 10 batch chips to avoid clutter
-        display_batches = progress.batches[:10] if len(progress.batches) > 10 else progress.batches
-        for b in display_batches:
-            batch_chips += f'<span class="batch-chip {b.status}">{b.batch_num}</span>'
-        if len(progress.batches) > 10:
-            remaining = len(progress.batches) - 10
-            batch_chips += f'<span class="batch-chip pending">+{remaining}</span>'
+# Progress ring geometry (matches the 140x140 / 60x60 SVG viewBoxes)
+PROGRESS_RING_RADIUS = 60
+PROGRESS_RING_CIRCUMFERENCE = 2 * math.pi * PROGRESS_RING_RADIUS
+COMPACT_RING_RADIUS = 25
+COMPACT_RING_CIRCUMFERENCE = 2 * math.pi * COMPACT_RING_RADIUS
 
-    phase_icon = get_phase_icon(progress.phase)
-    phase_label = get_phase_label(progress.phase)
+# Redraw progress at most twice per second (each redraw is a round-trip to the browser)
+PROGRESS_UPDATE_INTERVAL = 0.5
 
-    html = f"""
+# Progress component HTML, parsed once; render_progress_component only fills in the values
+PROGRESS_TEMPLATE = string.Template("""
     <div class="progress-container">
         <!-- Circular Progress Ring -->
         <div class="progress-ring-container">
             <div class="progress-ring">
                 <svg viewBox="0 0 140 140">
-                    <circle class="bg" cx="70" cy="70" r="{radius}"/>
-                    <circle class="progress" cx="70" cy="70" r="{radius}"
-                        stroke-dasharray="{circumference}"
-                        stroke-dashoffset="{progress_offset}"/>
+                    <circle class="bg" cx="70" cy="70" r="$radius"/>
+                    <circle class="progress" cx="70" cy="70" r="$radius"
+                        stroke-dasharray="$circumference"
+                        stroke-dashoffset="$progress_offset"/>
                 </svg>
                 <div class="center-text">
-                    <span class="percentage">{int(progress.overall_progress)}%</span>
-                    <span class="page-count">{progress.current_page}/{progress.total_pages}</span>
+                    <span class="percentage">$percentage%</span>
+                    <span class="page-count">$current_page/$total_pages</span>
                 </div>
             </div>
         </div>
 
         <!-- Batch Progress (if multiple batches) -->
-        {"" if progress.total_batches <= 1 else f'''
-        <div class="batch-progress">
-            <div class="batch-label">
-                <span>Batch {progress.current_batch + 1} of {progress.total_batches}</span>
-                <span>{int(batch_pct)}%</span>
-            </div>
-            <div class="batch-bar">
-                <div class="batch-bar-fill" style="width: {batch_pct}%"></div>
-            </div>
-            <div class="batch-chips">{batch_chips}</div>
-        </div>
-        '''}
+        $batch_block
 
         <!-- Status Info -->
         <div class="status-info">
             <div class="status-row">
                 <span class="status-label">Status</span>
-                <span class="status-value processing-indicator">{phase_icon} {phase_label}</span>
+                <span class="status-value processing-indicator">$phase_icon $phase_label</span>
             </div>
             <div class="status-row">
                 <span class="status-label">Time Remaining</span>
-                <span class="status-value">{progress.format_eta()}</span>
+                <span class="status-value">$eta</span>
             </div>
-            {"" if not current_filename else f'''
+            $filename_block
+        </div>
+    </div>
+    """)
+
+BATCH_BLOCK_TEMPLATE = string.Template("""
+        <div class="batch-progress">
+            <div class="batch-label">
+                <span>Batch $batch_number of $total_batches</span>
+                <span>$batch_percentage%</span>
+            </div>
+            <div class="batch-bar">
+                <div class="batch-bar-fill" style="width: $batch_pct%"></div>
+            </div>
+            <div class="batch-chips">$batch_chips</div>
+        </div>
+        """)
+
+FILENAME_BLOCK_TEMPLATE = string.Template("""
             <div class="status-row">
                 <span class="status-label">Current Page</span>
-                <span class="status-value">{current_filename[:25]}{"..." if len(current_filename) > 25 else ""}</span>
+                <span class="status-value">$filename</span>
             </div>
-            '''}
-        </div>
-    </div>
+            """)
+
+
+def render_progress_component(progress: UploadProgress, current_filename: str = "") -> str:
     """
-    return html
+    Render the mobile-friendly progress component as HTML.
+
+    Args:
+        progress: UploadProgress object with current state
+        current_filename: Name of the file currently being processed
+
+    Returns:
+        HTML string for the progress component
+    """
+    # Calculate SVG circle parameters (offset in whole pixels, so redraws
+    # within the same page produce identical HTML)
+    circumference = PROGRESS_RING_CIRCUMFERENCE
+    progress_offset = round(circumference * (1 - progress.overall_progress / 100))
+
+    # Batch chips and bar - skipped entirely for single-batch books
+    batch_block = ""
+    if progress.total_batches > 1:
+        # Calculate batch bar width
+        batch_pct = progress.batch_progress
+
+        # Show max 10 batch chips to avoid clutter
+        chips = [
+            f'<span class="batch-chip {b.status}">{b.batch_num}</span>'
+            for b in progress.batches[:10]
+        ]
+        if len(progress.batches) > 10:
+            remaining = len(progress.batches) - 10
+            chips.append(f'<span class="batch-chip pending">+{remaining}</span>')
+        batch_chips = "".join(chips)
+
+        batch_block = BATCH_BLOCK_TEMPLATE.substitute(
+            batch_number=progress.current_batch + 1,
+            total_batches=progress.total_batches,
+            batch_percentage=int(batch_pct),
+            batch_pct=batch_pct,
+            batch_chips=batch_chips,
+        )
+
+    filename_block = ""
+    if current_filename:
+        filename_block = FILENAME_BLOCK_TEMPLATE.substitute(
+            filename=f'{current_filename[:25]}{"..." if len(current_filename) > 25 else ""}',
+        )
+
+    return PROGRESS_TEMPLATE.substitute(
+        radius=PROGRESS_RING_RADIUS,
+        circumference=circumference,
+        progress_offset=progress_offset,
+        percentage=int(progress.overall_progress),
+        current_page=progress.current_page,
+        total_pages=progress.total_pages,
+        batch_block=batch_block,
+        phase_icon=get_phase_icon(progress.phase),
+        phase_label=get_phase_label(progress.phase),
+        eta=progress.format_eta(),
+        filename_block=filename_block,
+    )
 
 
 def render_compact_progress(progress: UploadProgress) -> str:
@@ -320,9 +367,9 @@ def render_compact_progress(progress: UploadProgress) -> str:
     Returns:
         HTML string for compact progress
     """
-    radius = 25
-    circumference = 2 * 3.14159 * radius
-    progress_offset = circumference - (progress.overall_progress / 100) * circumference
+    radius = COMPACT_RING_RADIUS
+    circumference = COMPACT_RING_CIRCUMFERENCE
+    progress_offset = round(circumference * (1 - progress.overall_progress / 100))
 
     html = f"""
     <div class="compact-progress">
@@ -363,17 +410,20 @@ def init_session_state():
         "paused_at_checkpoint": False,
         "paused_at_batch": False,  # Pause between batches
         "current_index": 0,
-        "results": [],  # List of (filename, translated_image) tuples - DEPRECATED, use temp_storage
-        "uploaded_images": [],  # List of (filename, PIL Image) tuples - only for preview now
-        "accumulated_images": [],  # For chunked upload mode
+        "uploaded_images": None,  # TempPageStorage with the pages of the submitted batch job
+        "accumulated_images": None,  # TempPageStorage for chunked upload mode
         "batch_job_id": None,
+        "batch_status": None,  # (job_id, status dict) of the last status check
         "upload_mode": "single",  # "single" or "chunked"
         "upload_progress": None,  # UploadProgress object for tracking
         "last_page_time": None,  # For ETA calculation
         "temp_storage": None,  # TempResultStorage for memory-efficient result storage
+        "page_cache": None,  # PageResultCache of pages translated in this session
         "zip_file_ref": None,  # Reference to uploaded ZIP file for streaming
+        "zip_scan": None,  # ((file_id, size), (count, sorted_names)) for the current ZIP
         "total_pages": 0,  # Total pages count for streaming mode
         "file_refs": None,  # File references for single-upload streaming mode
+        "observed_page_seconds": None,  # Median seconds per page from the last run (for estimates)
     }
     for key, value in defaults.items():
         if key not in st.session_state:
@@ -382,6 +432,17 @@ def init_session_state():
 
 init_session_state()
 
+
+def get_page_cache() -> PageResultCache:
+    """This session's page cache, created on first use."""
+    if st.session_state.page_cache is None:
+        st.session_state.page_cache = PageResultCache()
+    return st.session_state.page_cache
+
+# Restore the batch job ID from the URL so a page reload can resume polling
+if not st.session_state.batch_job_id and "job_id" in st.query_params:
+    st.session_state.batch_job_id = st.query_params["job_id"]
+
 # Inject CSS for progress component
 st.markdown(PROGRESS_CSS, unsafe_allow_html=True)
 
@@ -410,11 +471,21 @@ with st.sidebar:
         st.json(stats)
 
     if st.button("🔄 Reset Session"):
-        # Clean up temp storage before resetting
+        # Clean up on-disk storage before resetting
         if st.session_state.get("temp_storage"):
             st.session_state.temp_storage.cleanup()
+        if st.session_state.get("accumulated_images"):
+            st.session_state.accumulated_images.cleanup()
+        if st.session_state.get("uploaded_images"):
+            st.session_state.uploaded_images.cleanup()
+        if st.session_state.get("page_cache"):
+            st.session_state.page_cache.cleanup()
+        # Empty the database in place and keep its connection; everything
+        # else in the session starts over
+        reset_database()
         for key in list(st.session_state.keys()):
-            del st.session_state[key]
+            if key not in ("db_conn", "db_lock"):
+                del st.session_state[key]
         st.rerun()
 
 
@@ -456,9 +527,16 @@ if is_zip:
 
         try:
             # MEMORY-EFFICIENT: Count images without loading them
-            logger.info("Counting images in ZIP (without loading)...")
-            image_count, image_filenames = count_images_in_zip(zip_file)
-            logger.info(f"ZIP scan found {image_count} valid images")
+            # Scan once per uploaded file - reruns reuse the cached result
+            zip_key = (getattr(zip_file, "file_id", zip_file.name), zip_file.size)
+            cached_scan = st.session_state.zip_scan
+            if cached_scan and cached_scan[0] == zip_key:
+                image_count, image_filenames = cached_scan[1]
+            else:
+                logger.info("Counting images in ZIP (without loading)...")
+                image_count, image_filenames = count_images_in_zip(zip_file)
+                st.session_state.zip_scan = (zip_key, (image_count, image_filenames))
+                logger.info(f"ZIP scan found {image_count} valid images")
 
             if image_count == 0:
                 logger.warning("No valid images found in ZIP file")
@@ -472,11 +550,11 @@ if is_zip:
                 # Store ZIP reference for streaming during processing
                 st.session_state.zip_file_ref = zip_file
                 st.session_state.total_pages = image_count
-                logger.debug(f"Stored ZIP reference for streaming")
+                logger.debug("Stored ZIP reference for streaming")
 
                 # Estimate time
                 if "Real-time" in mode:
-                    est_time = estimate_processing_time(image_count)
+                    est_time = estimate_processing_time(image_count, st.session_state.observed_page_seconds)
                     st.info(f"⏱️ Estimated processing time: {est_time}")
 
                 # Memory efficiency notice
@@ -488,6 +566,8 @@ if is_zip:
                 logger.info("ZIP upload handling complete, ready for streaming processing")
 
         except Exception as e:
+            import traceback  # Only needed on this error path
+
             error_msg = f"Error scanning ZIP file: {e}"
             logger.error(error_msg, exc_info=True)
             extraction_status.error(error_msg)
@@ -515,15 +595,15 @@ elif is_chunked:
             preview_count = min(8, accumulated_count)
             cols = st.columns(min(4, preview_count))
             for i in range(preview_count):
-                filename, img = st.session_state.accumulated_images[i]
+                filename, thumbnail = st.session_state.accumulated_images.get_thumbnail(i)
                 with cols[i % 4]:
-                    st.image(img, caption=filename, width=120)
+                    st.image(thumbnail, caption=filename, width=120)
             if accumulated_count > 8:
                 st.caption(f"... and {accumulated_count - 8} more pages")
 
         # Clear button
         if st.button("🗑️ Clear all accumulated pages"):
-            st.session_state.accumulated_images = []
+            st.session_state.accumulated_images.cleanup()
             st.rerun()
 
     # Chunked file uploader
@@ -543,22 +623,18 @@ elif is_chunked:
         else:
             # Add to accumulated images
             if st.button(f"➕ Add {len(uploaded_files)} pages to queue", type="primary"):
-                with st.spinner(f"Loading {len(uploaded_files)} images..."):
-                    for f in uploaded_files:
-                        img = load_image_from_upload(f)
-                        st.session_state.accumulated_images.append((f.name, img))
-
-                # Sort accumulated images naturally
-                st.session_state.accumulated_images.sort(
-                    key=lambda x: sort_files_naturally([x[0]])[0]
-                )
+                if st.session_state.accumulated_images is None:
+                    st.session_state.accumulated_images = TempPageStorage()
+                with st.spinner(f"Saving {len(uploaded_files)} images..."):
+                    # Kept on disk (naturally sorted) and decoded only when processed
+                    st.session_state.accumulated_images.add_uploads(uploaded_files)
                 st.success(f"✅ Added {len(uploaded_files)} pages!")
                 st.rerun()
 
     # For processing, use accumulated images
     if st.session_state.accumulated_images:
         # Create a virtual "uploaded_files" list for compatibility
-        uploaded_files = st.session_state.accumulated_images
+        uploaded_files = st.session_state.accumulated_images.pages
         sorted_files = uploaded_files  # Already sorted
     else:
         uploaded_files = None
@@ -582,7 +658,7 @@ else:
             st.stop()
 
         # Sort files naturally (just references, not loading into memory)
-        sorted_files = sorted(uploaded_files, key=lambda f: sort_files_naturally([f.name])[0])
+        sorted_files = sort_files_naturally(uploaded_files, name_of=lambda f: f.name)
 
         # MEMORY-EFFICIENT: Store file references, not loaded images
         st.session_state.file_refs = sorted_files
@@ -594,7 +670,7 @@ else:
 
         # Estimate time
         if "Real-time" in mode:
-            est_time = estimate_processing_time(len(sorted_files))
+            est_time = estimate_processing_time(len(sorted_files), st.session_state.observed_page_seconds)
             st.info(f"⏱️ Estimated processing time: {est_time}")
 
         if len(sorted_files) > 50 and "Real-time" in mode:
@@ -661,7 +737,7 @@ st.header("2️⃣ Translate")
 if "Real-time" in mode:
     # Real-time processing with batching and mobile-friendly progress
     if is_zip:
-        has_files = bool(uploaded_files)  # ZIP: uploaded_files is list of (name, image) tuples
+        has_files = bool(uploaded_files)  # ZIP: uploaded_files is a flag, images stream at start
     elif is_chunked:
         has_files = bool(st.session_state.accumulated_images)
     else:
@@ -675,11 +751,13 @@ if "Real-time" in mode:
     if st.button("🚀 Start Translation", disabled=start_disabled, type="primary") or st.session_state.processing:
         logger.info(f"Start Translation button clicked or processing={st.session_state.processing}")
 
+        # Deferred: pulls in the Gemini SDK, which the upload screens don't need
+        from translator import process_pages_concurrently
+
         if not st.session_state.processing:
             # Starting fresh - MEMORY EFFICIENT: Don't load all images upfront
             logger.info("Starting fresh processing session (memory-efficient mode)")
             st.session_state.processing = True
-            st.session_state.results = []  # Keep for backward compatibility
             st.session_state.current_index = 0
 
             # Initialize temp storage for results (saves to disk, not memory)
@@ -690,7 +768,7 @@ if "Real-time" in mode:
             total_pages = st.session_state.total_pages
             logger.info(f"Initializing progress tracking for {total_pages} pages")
             st.session_state.upload_progress = init_upload_progress(total_pages, BATCH_SIZE)
-            st.session_state.last_page_time = time.time()
+            st.session_state.last_page_time = time.monotonic()
 
         # Processing UI with batched progress
         total = st.session_state.total_pages
@@ -710,56 +788,59 @@ if "Real-time" in mode:
         current_batch_idx = start_from // BATCH_SIZE
 
         # MEMORY-EFFICIENT: Create image iterator based on upload mode
-        def get_image_iterator():
-            """Generator that yields (filename, image) one at a time."""
+        def get_image_iterator(start: int = 0):
+            """
+            Generator that yields (filename, image) one at a time, starting at
+            page `start`. Earlier pages are skipped without being decoded.
+            Pages that fail to decode come through as (filename, None), so
+            yielded positions always match source positions for resuming.
+            """
             if is_zip:
                 # Stream from ZIP file
                 zip_file = st.session_state.zip_file_ref
                 if zip_file:
                     zip_file.seek(0)
-                    yield from stream_images_from_zip(zip_file)
+                    yield from stream_images_from_zip(zip_file, skip=start, keep_failed=True)
             elif is_chunked:
-                # Chunked mode: iterate through accumulated images
-                for item in st.session_state.accumulated_images:
-                    yield item
+                # Chunked mode: decode accumulated pages from disk
+                yield from st.session_state.accumulated_images.stream_images(start, keep_failed=True)
             else:
-                # Single mode: load one file at a time
+                # Single mode: load one file at a time (next one decodes in the background)
                 file_refs = st.session_state.file_refs
                 if file_refs:
-                    for f in file_refs:
-                        img = load_image_from_upload(f)
-                        yield (f.name, img)
+                    yield from stream_images_from_uploads(file_refs[start:], keep_failed=True)
 
-        # Skip already processed images and process remaining
-        image_iter = get_image_iterator()
-        for skip_idx in range(start_from):
-            try:
-                next(image_iter)
-            except StopIteration:
-                break
+        # Resume after already processed images
+        image_iter = get_image_iterator(start_from)
 
-        # Process remaining images
-        for i, (filename, image) in enumerate(image_iter, start=start_from):
+        # Stop at the next review pause (every N batches for 50+ page books)
+        stop_at = total
+        if total > 50:
+            pause_every = BATCH_SIZE * PAUSE_EVERY_N_BATCHES
+            stop_at = min(total, (start_from // pause_every + 1) * pause_every)
+
+        progress.phase = "verifying" if verify else "processing"
+        progress_header.markdown(render_progress_component(progress, ""), unsafe_allow_html=True)
+        last_render = 0.0
+        last_page_time = st.session_state.last_page_time
+
+        # Process remaining images - several pages in flight, results in page order
+        # Pages translated before in this session (e.g. before a stop) come from the cache
+        pages = itertools.islice(image_iter, stop_at - start_from)
+        page_results = process_pages_concurrently(pages, verify=verify, cache=get_page_cache())
+        for i, (filename, result) in enumerate(page_results, start=start_from):
             # Update batch tracking
             batch_idx = i // BATCH_SIZE
             page_in_batch = i % BATCH_SIZE
 
             # Check if we've moved to a new batch
-            if batch_idx != current_batch_idx:
+            batch_changed = batch_idx != current_batch_idx
+            if batch_changed:
                 if current_batch_idx < len(progress.batches):
                     progress.batches[current_batch_idx].status = "completed"
                 current_batch_idx = batch_idx
-
-                # Pause every N batches for large uploads (100+ pages)
-                if total > 50 and batch_idx > 0 and batch_idx % PAUSE_EVERY_N_BATCHES == 0:
-                    progress.current_batch = batch_idx
-                    progress.phase = "paused"
-                    progress.is_paused = True
-                    st.session_state.paused_at_batch = True
-                    st.session_state.current_index = i
-                    # Clear image from memory before pausing
-                    del image
-                    st.rerun()
+                # Package the finished batch while the next one translates
+                temp_storage.update_zip()
 
             # Update current batch status
             if batch_idx < len(progress.batches):
@@ -769,29 +850,28 @@ if "Real-time" in mode:
             # Update progress state
             progress.current_page = i
             progress.current_batch = batch_idx
-            progress.phase = "verifying" if verify else "processing"
 
             # Calculate time for this page (for ETA)
-            current_time = time.time()
-            if st.session_state.last_page_time:
-                page_duration = current_time - st.session_state.last_page_time
+            current_time = time.monotonic()
+            if last_page_time:
+                page_duration = current_time - last_page_time
                 if page_duration > 0 and page_duration < 120:
-                    progress.pages_processed_times.append(page_duration)
-
-            # Update progress displays
-            progress_bar.progress((i + 1) / total)
-            progress_header.markdown(render_progress_component(progress, filename), unsafe_allow_html=True)
-
-            batch_info = f"Batch {batch_idx + 1}/{progress.total_batches}" if progress.total_batches > 1 else ""
-            progress_text.markdown(
-                f"**Page {i + 1}/{total}** | {batch_info} | ⏱️ {progress.format_eta()} remaining | 📄 `{filename}`"
-            )
+                    progress.add_page_time(page_duration)
+            last_page_time = current_time
+
+            # Update progress displays (throttled - each redraw is a round-trip to the browser)
+            now = time.monotonic()
+            if now - last_render >= PROGRESS_UPDATE_INTERVAL or batch_changed or i + 1 == stop_at:
+                last_render = now
+                progress_bar.progress((i + 1) / total)
+                progress_header.markdown(render_progress_component(progress, filename), unsafe_allow_html=True)
+
+                batch_info = f"Batch {batch_idx + 1}/{progress.total_batches}" if progress.total_batches > 1 else ""
+                progress_text.markdown(
+                    f"**Page {i + 1}/{total}** | {batch_info} | ⏱️ {progress.format_eta()} remaining | 📄 `{filename}`"
+                )
 
             try:
-                # Process the page
-                result = process_single_page(image, filename, verify=verify)
-                st.session_state.last_page_time = time.time()
-
                 if result["status"] == "failed":
                     log_error(filename, result.get("error", "Unknown error"))
                     status_icon = "❌"
@@ -806,26 +886,46 @@ if "Real-time" in mode:
                 translated_img = result.get("translated_image")
                 if translated_img is not None:
                     temp_storage.save_result(filename, translated_img)
-                    logger.debug(f"Saved {filename} to temp storage, total: {temp_storage.get_result_count()}")
+                    logger.debug("Saved %s to temp storage, total: %d", filename, temp_storage.get_result_count())
                     del translated_img
 
-                del result
-
             except Exception as e:
                 log_error(filename, str(e))
                 status_text.error(f"❌ Error processing {filename}: {e}")
-                st.session_state.last_page_time = time.time()
 
-            # MEMORY-EFFICIENT: Delete original image to free memory
-            del image
+            # MEMORY-EFFICIENT: Drop the result (and its image) to free memory
+            del result
 
-            # Update session state
+            # Update session state (every page: an interrupted run resumes from here,
+            # and results already saved to temp_storage must not be saved again)
             st.session_state.current_index = i + 1
             progress.current_page = i + 1
 
             if batch_idx < len(progress.batches):
                 progress.batches[batch_idx].pages_completed = page_in_batch + 1
 
+        st.session_state.last_page_time = last_page_time
+
+        # Pages whose PNG couldn't be written are missing from the ZIP - report them
+        temp_storage.flush()
+        for filename, error in temp_storage.pop_new_failures():
+            log_error(filename, error)
+
+        # Remember the observed rate so the next upload gets a realistic estimate
+        if progress.pages_processed_times:
+            st.session_state.observed_page_seconds = statistics.median(progress.pages_processed_times)
+
+        # Pause every N batches for large uploads (100+ pages)
+        if stop_at < total:
+            if current_batch_idx < len(progress.batches):
+                progress.batches[current_batch_idx].status = "completed"
+            progress.current_batch = stop_at // BATCH_SIZE
+            progress.phase = "paused"
+            progress.is_paused = True
+            st.session_state.paused_at_batch = True
+            st.session_state.current_index = stop_at
+            st.rerun()
+
         # Mark final batch as complete
         if current_batch_idx < len(progress.batches):
             progress.batches[current_batch_idx].status = "completed"
@@ -845,6 +945,8 @@ if "Real-time" in mode:
 
 else:
     # Batch mode
+    from batch import submit_batch_job, check_batch_status, wait_for_batch_job, process_batch_results
+
     st.subheader("Batch Processing")
 
     col1, col2 = st.columns(2)
@@ -859,26 +961,40 @@ else:
     with col1:
         if st.button("📤 Submit Batch Job", disabled=not has_files):
             with st.spinner("Submitting batch job..."):
-                # Load images based on upload mode
+                # Stream pages based on upload mode (decoded one at a time)
                 if is_zip:
-                    # ZIP mode: images already extracted
-                    images = uploaded_files.copy() if uploaded_files else []
+                    # ZIP mode: stream entries out of the uploaded archive
+                    zip_file = st.session_state.zip_file_ref
+                    zip_file.seek(0)
+                    images = stream_images_from_zip(zip_file)
                 elif is_chunked:
-                    images = st.session_state.accumulated_images.copy()
+                    images = st.session_state.accumulated_images.stream_images(ahead=BATCH_DECODE_WORKERS)
                 else:
-                    sorted_files = sorted(uploaded_files, key=lambda f: sort_files_naturally([f.name])[0])
-                    images = [(f.name, load_image_from_upload(f)) for f in sorted_files]
-
-                # Submit batch
-                job_id = submit_batch_job(images)
+                    # sorted_files was naturally sorted once in the upload section
+                    images = stream_images_from_uploads(sorted_files, ahead=BATCH_DECODE_WORKERS)
+
+                # Stage the pages on disk (kept until the results come back),
+                # then submit from there, so the book is never all in memory
+                stored = TempPageStorage()
+                try:
+                    stored.add_images(images)
+                    job_id = submit_batch_job(stored.stream_images(ahead=BATCH_DECODE_WORKERS))
+                except Exception:
+                    stored.cleanup()
+                    raise
                 st.session_state.batch_job_id = job_id
-                st.session_state.uploaded_images = images
+                st.session_state.batch_status = None
+
+                if st.session_state.uploaded_images:
+                    st.session_state.uploaded_images.cleanup()
+                st.session_state.uploaded_images = stored
+                st.query_params["job_id"] = job_id
 
             st.success("✅ Batch job submitted!")
             st.code(job_id, language=None)
             st.info(
                 "📋 **Copy this Job ID!** You'll need it to check status and retrieve results. "
-                "Processing takes up to 24 hours."
+                "Processing takes up to 24 hours. The ID is also saved in this page's URL."
             )
 
     with col2:
@@ -893,14 +1009,27 @@ else:
     # Check status
     job_id_to_check = st.session_state.get("input_job_id") or st.session_state.batch_job_id
 
-    if job_id_to_check:
-        if st.button("🔄 Check Batch Status"):
-            status = check_batch_status(job_id_to_check)
-
+    @st.fragment
+    def batch_status_panel(job_id: str):
+        """Status checks rerun only this panel, not the upload and results sections."""
+        status_col1, status_col2 = st.columns(2)
+        with status_col1:
+            if st.button("🔄 Check Batch Status"):
+                st.session_state.batch_status = (job_id, check_batch_status(job_id))
+        with status_col2:
+            if st.button("⏳ Wait for Completion (up to 10 min)"):
+                with st.spinner("Waiting for batch job..."):
+                    st.session_state.batch_status = (job_id, wait_for_batch_job(job_id))
+
+        # A status checked for a different job ID (edited since) doesn't apply here
+        checked = st.session_state.batch_status
+        status = checked[1] if checked and checked[0] == job_id else None
+        if status:
             if status["error"]:
                 st.error(f"Error: {status['error']}")
             else:
                 st.write(f"**Status:** {status['status']}")
+                st.caption(f"Last checked {int(time.time() - status['checked_at'])}s ago")
                 st.progress(
                     status["completed"] / status["total"] if status["total"] > 0 else 0
                 )
@@ -922,49 +1051,70 @@ else:
                             with st.spinner("Generating translated images..."):
                                 progress_bar = st.progress(0)
 
-                                def update_progress(current, total):
-                                    progress_bar.progress(current / total)
+                                last_render = 0.0
 
-                                results = process_batch_results(
-                                    job_id_to_check,
-                                    st.session_state.uploaded_images,
+                                def update_progress(current, total):
+                                    # Throttled: pages finish in bursts with concurrent edits
+                                    nonlocal last_render
+                                    now = time.monotonic()
+                                    if now - last_render >= PROGRESS_UPDATE_INTERVAL or current == total:
+                                        last_render = now
+                                        progress_bar.progress(current / total)
+
+                                # Results go to disk like real-time mode, not into session memory
+                                if st.session_state.temp_storage:
+                                    st.session_state.temp_storage.cleanup()
+                                temp_storage = TempResultStorage()
+                                st.session_state.temp_storage = temp_storage
+
+                                page_results = process_batch_results(
+                                    job_id,
+                                    st.session_state.uploaded_images.stream_images(),
                                     verify=verify,
                                     progress_callback=update_progress,
+                                    cache=get_page_cache(),
                                 )
+                                for saved, (filename, img, _) in enumerate(page_results, start=1):
+                                    temp_storage.save_result(filename, img)
+                                    # Package finished pages while later ones are edited
+                                    if saved % 20 == 0:
+                                        temp_storage.update_zip()
 
-                                st.session_state.results = [
-                                    (filename, img) for filename, img, _ in results
-                                ]
+                                temp_storage.flush()
+                                for filename, error in temp_storage.pop_new_failures():
+                                    log_error(filename, error)
 
-                            st.success(
-                                f"✅ Done! {len(st.session_state.results)} pages translated."
-                            )
+                            # Full rerun so the results section picks up the new pages
+                            st.rerun()
+
+    if job_id_to_check:
+        batch_status_panel(job_id_to_check)
 
 
 # Results section
 st.header("3️⃣ Download Results")
 
-# Check for results in temp_storage (memory-efficient) or legacy results list
+# Results are stored on disk in temp_storage
 temp_storage = st.session_state.get("temp_storage")
 has_temp_results = temp_storage is not None and temp_storage.get_result_count() > 0
-has_legacy_results = bool(st.session_state.results)
 
 if has_temp_results:
     # MEMORY-EFFICIENT: Results are stored on disk
     num_results = temp_storage.get_result_count()
     st.success(f"📄 {num_results} translated pages ready for download")
 
-    # Download button - streams from disk
+    # Download button - the ZIP is built on disk and reused across reruns
     with st.spinner("Creating ZIP file from saved results..."):
-        zip_bytes = temp_storage.create_zip()
-
-    st.download_button(
-        "📥 Download All (ZIP)",
-        data=zip_bytes,
-        file_name="translated_book.zip",
-        mime="application/zip",
-        type="primary",
-    )
+        zip_path = temp_storage.create_zip()
+
+    with open(zip_path, "rb") as zip_file:
+        st.download_button(
+            "📥 Download All (ZIP)",
+            data=zip_file,
+            file_name="translated_book.zip",
+            mime="application/zip",
+            type="primary",
+        )
 
     # Show any issues
     verification_issues = get_verification_issues()
@@ -979,34 +1129,6 @@ if has_temp_results:
             for page in failed_pages:
                 st.write(f"**{page['filename']}:** {page['error']}")
 
-elif has_legacy_results:
-    # Legacy mode: results in memory (backward compatibility)
-    num_results = len(st.session_state.results)
-    st.success(f"📄 {num_results} translated pages ready for download")
-
-    with st.spinner("Creating ZIP file..."):
-        zip_bytes = create_zip_in_memory(st.session_state.results)
-
-    st.download_button(
-        "📥 Download All (ZIP)",
-        data=zip_bytes,
-        file_name="translated_book.zip",
-        mime="application/zip",
-        type="primary",
-    )
-
-    verification_issues = get_verification_issues()
-    if verification_issues:
-        with st.expander(f"⚠️ {len(verification_issues)} pages flagged for review"):
-            for issue in verification_issues:
-                st.write(f"**{issue['filename']}:** {', '.join(issue['issues'])}")
-
-    failed_pages = get_failed_pages()
-    if failed_pages:
-        with st.expander(f"❌ {len(failed_pages)} pages failed"):
-            for page in failed_pages:
-                st.write(f"**{page['filename']}:** {page['error']}")
-
 else:
     st.info("👆 Upload pages and start translation to see results here.")
 
@@ -4,34 +4,42 @@ Handles Gemini Batch API for cheaper overnight processing.
 """
 
 import io
+import json
+import logging
+import threading
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Iterator, Optional
 
-import streamlit as st
-from google import genai
 from google.genai import types
 from PIL import Image
-
-from database import save_batch_job, get_batch_job, update_batch_job_status
-from translator import parse_json_response, edit_image_with_hebrew, verify_translation
-
-
-def get_client() -> genai.Client:
-    """Get Gemini client with API key from Streamlit secrets."""
-    return genai.Client(api_key=st.secrets["GEMINI_API_KEY"])
-
-
-def submit_batch_job(images: list[tuple[str, Image.Image]]) -> str:
-    """
-    Submit batch job for extraction + translation.
-    Returns job ID for status checking later.
-
-    Args:
-        images: List of (filename, PIL Image) tuples
-    """
-    client = get_client()
-
-    prompt = '''
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from database import save_batch_job, update_batch_job_status
+from translator import (
+    EDIT_PROMPT_TEMPLATE,
+    MODEL_IMAGE_EDIT,
+    VERIFY_PROMPT,
+    get_client,
+    parse_json_response,
+    edit_image_with_hebrew,
+    verify_translation,
+)
+from utils import MAX_CONCURRENT_PAGES, PageResultCache, image_content_hash, ordered_map
+
+logger = logging.getLogger(__name__)
+
+
+# Batch job states after which polling can stop
+BATCH_DONE_STATES = {
+    "SUCCEEDED", "JOB_STATE_SUCCEEDED",
+    "FAILED", "JOB_STATE_FAILED",
+    "CANCELLED", "JOB_STATE_CANCELLED",
+    "EXPIRED", "JOB_STATE_EXPIRED",
+}
+
+# Extraction + translation prompt sent with every page of a batch job
+BATCH_EXTRACTION_PROMPT = '''
     1. Extract ALL English text from this image exactly as written.
     2. Translate each text element to Hebrew.
 
@@ -48,13 +56,49 @@ def submit_batch_job(images: list[tuple[str, Image.Image]]) -> str:
     {"extracted_text": "", "translations": []}
     '''
 
-    requests = []
-    for i, (filename, image) in enumerate(images):
-        # Convert image to bytes for batch API
-        img_buffer = io.BytesIO()
-        image.save(img_buffer, format="PNG")
-        img_bytes = img_buffer.getvalue()
+# JPEG quality for pages sent for text extraction (text stays crisp at 90)
+SUBMIT_JPEG_QUALITY = 90
+
+# check_batch_status reuses a job's status for this many seconds. A plain dict
+# rather than st.cache_data, whose fixed ttl can't be bypassed per call
+# (wait_for_batch_job needs fresh state) and which would cache error statuses
+STATUS_CACHE_TTL = 15
+_status_cache: dict[str, dict] = {}
+_status_cache_lock = threading.Lock()
+
+
+def _encode_page(image: Image.Image, image_format: str) -> bytes:
+    """Convert a page image to bytes for the batch API."""
+    img_buffer = io.BytesIO()
+    if image_format == "JPEG":
+        image.convert("RGB").save(img_buffer, format="JPEG", quality=SUBMIT_JPEG_QUALITY)
+    else:
+        image.save(img_buffer, format="PNG", compress_level=1)
+    return img_buffer.getvalue()
 
+
+def submit_batch_job(images: Iterable[tuple[str, Image.Image]], image_format: str = "JPEG") -> str:
+    """
+    Submit batch job for extraction + translation.
+    Returns job ID for status checking later.
+
+    Args:
+        images: (filename, PIL Image) tuples, consumed one at a time
+        image_format: "JPEG" (default, several times smaller to upload) or
+            "PNG" (lossless). Only text extraction sees these bytes; image
+            editing later uses the original pages.
+    """
+    client = get_client()
+
+    # Encode pages on worker threads; only the encoded bytes are kept
+    encoded_pages = ordered_map(
+        lambda page: (page[0], _encode_page(page[1], image_format)),
+        images,
+        workers=MAX_CONCURRENT_PAGES,
+    )
+
+    requests = []
+    for i, (filename, img_bytes) in enumerate(encoded_pages):
         custom_id = f"page_{i:04d}_{Path(filename).stem}"
 
         requests.append(types.BatchJobSource(
@@ -63,9 +107,9 @@ def submit_batch_job(images: list[tuple[str, Image.Image]]) -> str:
                 model="gemini-2.5-flash",
                 contents=[
                     types.Content(parts=[
-                        types.Part(text=prompt),
+                        types.Part(text=BATCH_EXTRACTION_PROMPT),
                         types.Part(inline_data=types.Blob(
-                            mime_type="image/png",
+                            mime_type=f"image/{image_format.lower()}",
                             data=img_bytes
                         ))
                     ])
@@ -83,42 +127,76 @@ def submit_batch_job(images: list[tuple[str, Image.Image]]) -> str:
     )
 
     # Save to database
-    save_batch_job(batch_job.name, len(images))
+    save_batch_job(batch_job.name, len(requests))
 
     return batch_job.name
 
 
-def check_batch_status(job_id: str) -> dict:
+def check_batch_status(job_id: str, max_age: float = STATUS_CACHE_TTL) -> dict:
     """
     Check if batch job is complete.
-    Returns status dict with state and progress.
+    Returns status dict with state, progress and checked_at (epoch seconds).
+    A status fetched less than max_age seconds ago (by any session) is
+    reused instead of calling the API again; pass max_age=0 to force a fetch.
     """
+    with _status_cache_lock:
+        cached = _status_cache.get(job_id)
+    if cached and time.time() - cached["checked_at"] < max_age:
+        return cached
+
     client = get_client()
 
     try:
         job = client.batches.get(name=job_id)
 
-        return {
+        status = {
             "status": job.state.name if hasattr(job.state, 'name') else str(job.state),
             "completed": getattr(job, 'succeeded_request_count', 0) or 0,
             "failed": getattr(job, 'failed_request_count', 0) or 0,
             "total": getattr(job, 'total_request_count', 0) or 0,
-            "error": None
+            "error": None,
+            "checked_at": time.time(),
         }
     except Exception as e:
+        # Errors are not cached, so the next check retries
         return {
             "status": "ERROR",
             "completed": 0,
             "failed": 0,
             "total": 0,
-            "error": str(e)
+            "error": str(e),
+            "checked_at": time.time(),
         }
 
+    with _status_cache_lock:
+        _status_cache[job_id] = status
+    return status
+
+
+def wait_for_batch_job(job_id: str, max_wait: float = 600) -> dict:
+    """
+    Poll a batch job with exponential backoff (2s, 4s, ... capped at 60s)
+    until it finishes, errors, or max_wait seconds have passed.
+    Returns the last status dict from check_batch_status.
+    """
+    deadline = time.monotonic() + max_wait
+    delay = 2
+
+    while True:
+        status = check_batch_status(job_id, max_age=0)
+        remaining = deadline - time.monotonic()
+        if status["error"] or status["status"] in BATCH_DONE_STATES or remaining <= 0:
+            return status
+
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 60)
+
 
 def get_batch_results(job_id: str) -> list[dict]:
     """
     Retrieve results from completed batch job.
-    Returns list of dicts with custom_id and parsed translation result.
+    Returns list of dicts with custom_id and parsed translation result, in
+    the order the API returns them (callers match pages by custom_id).
     """
     client = get_client()
 
@@ -140,89 +218,135 @@ def get_batch_results(job_id: str) -> list[dict]:
                 "error": str(e)
             })
 
-    # Sort by custom_id to maintain page order
-    results.sort(key=lambda x: x["custom_id"])
-
     return results
 
 
+def _edit_page_from_result(
+    filename: str,
+    original_image: Image.Image,
+    result: dict,
+    verify: bool,
+) -> tuple[str, Image.Image, dict]:
+    """Run image editing (and optional verification) for one batch result."""
+    result_dict = {
+        "status": "completed",
+        "verification": None,
+        "error": result.get("error")
+    }
+
+    if result["error"]:
+        result_dict["status"] = "failed"
+        return (filename, original_image, result_dict)
+
+    try:
+        translations = result["translations"]
+
+        # Edit image with Hebrew text
+        if translations:
+            translated_image = edit_image_with_hebrew(original_image, translations)
+        else:
+            translated_image = original_image
+
+        # Optional verification
+        if verify and translations:
+            verification = verify_translation(original_image, translated_image)
+            result_dict["verification"] = verification
+            if not verification.get("pass", True):
+                result_dict["status"] = "needs_review"
+
+        return (filename, translated_image, result_dict)
+
+    except Exception as e:
+        result_dict["status"] = "failed"
+        result_dict["error"] = str(e)
+        return (filename, original_image, result_dict)
+
+
 def process_batch_results(
     job_id: str,
-    images: list[tuple[str, Image.Image]],
+    images: Iterable[tuple[str, Image.Image]],
     verify: bool = False,
-    progress_callback: Optional[callable] = None
-) -> list[tuple[str, Image.Image, dict]]:
+    progress_callback: Optional[callable] = None,
+    max_workers: int = MAX_CONCURRENT_PAGES,
+    cache: Optional[PageResultCache] = None,
+) -> Iterator[tuple[str, Image.Image, dict]]:
     """
     Process batch results: retrieve translations and run image editing.
+    Image edits for up to max_workers pages run at once.
+
+    With a cache, pages edited before with the same translations (by an
+    earlier run of this job in this session) skip the image edit and
+    verification, and new results are added.
 
     Args:
         job_id: Batch job ID
-        images: Original images as list of (filename, PIL Image) tuples
+        images: Original images as (filename, PIL Image) tuples, in the order
+            they were submitted; they are consumed one at a time
         verify: Whether to run verification
         progress_callback: Optional callback(current, total) for progress updates
+        max_workers: Number of pages edited concurrently
+        cache: Optional PageResultCache for this session
 
-    Returns:
-        List of (filename, translated_image, result_dict) tuples
+    Yields:
+        (filename, translated_image, result_dict) tuples in page order
     """
     # Get batch results
     batch_results = get_batch_results(job_id)
 
-    # Create mapping from custom_id to original image
-    image_map = {}
-    for i, (filename, image) in enumerate(images):
-        custom_id = f"page_{i:04d}_{Path(filename).stem}"
-        image_map[custom_id] = (filename, image)
+    # Create mapping from custom_id to batch result
+    result_map = {result["custom_id"]: result for result in batch_results}
 
-    # Process each result
-    output = []
+    processed = 0
     total = len(batch_results)
 
-    for i, result in enumerate(batch_results):
-        custom_id = result["custom_id"]
-        filename, original_image = image_map.get(custom_id, (custom_id, None))
-
-        if original_image is None:
-            continue
-
-        result_dict = {
-            "status": "completed",
-            "verification": None,
-            "error": result.get("error")
-        }
-
-        if result["error"]:
-            result_dict["status"] = "failed"
-            output.append((filename, original_image, result_dict))
-            continue
-
-        try:
-            translations = result["translations"]
-
-            # Edit image with Hebrew text
-            if translations:
-                translated_image = edit_image_with_hebrew(original_image, translations)
-            else:
-                translated_image = original_image
-
-            # Optional verification
-            if verify and translations:
-                verification = verify_translation(original_image, translated_image)
-                result_dict["verification"] = verification
-                if not verification.get("pass", True):
-                    result_dict["status"] = "needs_review"
-
-            output.append((filename, translated_image, result_dict))
-
-        except Exception as e:
-            result_dict["status"] = "failed"
-            result_dict["error"] = str(e)
-            output.append((filename, original_image, result_dict))
+    def edit_page(job: tuple[str, Image.Image, dict]) -> tuple[str, Image.Image, dict]:
+        filename, original_image, result = job
+        if cache is None or result["error"]:
+            return _edit_page_from_result(filename, original_image, result, verify)
+
+        # The edit depends only on the page and its translations (plus the
+        # edit model and prompts), so those make up the key
+        key = cache.page_key(
+            image_content_hash(original_image),
+            MODEL_IMAGE_EDIT,
+            EDIT_PROMPT_TEMPLATE,
+            json.dumps(result["translations"], ensure_ascii=False, sort_keys=True),
+            VERIFY_PROMPT if verify else "",
+        )
+        cached = cache.get(key)
+        if cached is not None:
+            # Already edited - skip the image edit and verification entirely
+            cached_image, meta = cached
+            return (filename, cached_image, {
+                "status": "completed",
+                "verification": meta["verification"],
+                "error": None
+            })
 
-        # Progress callback
+        output = _edit_page_from_result(filename, original_image, result, verify)
+        if output[2]["status"] == "completed":
+            try:
+                cache.put(key, output[1], {"verification": output[2]["verification"]})
+            except Exception as e:
+                logger.warning(f"Could not cache {filename}: {e}")
+        return output
+
+    def jobs() -> Iterator[tuple[str, Image.Image, dict]]:
+        # Each page that has a result, in page order
+        for i, (filename, original_image) in enumerate(images):
+            result = result_map.get(f"page_{i:04d}_{Path(filename).stem}")
+            if result is not None:
+                yield filename, original_image, result
+
+    # Workers go through get_client (st.cache_resource), which expects a script context
+    for output in ordered_map(edit_page, jobs(), workers=max_workers, ctx=get_script_run_ctx()):
+        processed += 1
+
+        # Progress callback (on the calling thread, so it can update the UI)
         if progress_callback:
-            progress_callback(i + 1, total)
+            progress_callback(processed, total)
 
-    # Update job status
-    update_batch_job_status(job_id, "completed", len(output))
+        yield output
 
-    return output
+    # Update job status
+    update_batch_job_status(job_id, "completed", processed)
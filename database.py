@@ -3,24 +3,53 @@ Database operations for Book Translator.
 Uses in-memory SQLite stored in Streamlit session state.
 """
 
+import functools
+import hashlib
 import sqlite3
 import json
+import threading
+import time
 from datetime import datetime
 from typing import Optional
 
 import streamlit as st
 
 
+# log_error buffers rows and writes them in one batch once either limit is hit
+ERROR_FLUSH_SIZE = 64
+ERROR_FLUSH_INTERVAL = 2.0  # seconds
+
+# Only guards creating a session's connection (and its lock) below
+_connect_lock = threading.Lock()
+
+
 def get_connection() -> sqlite3.Connection:
     """Get or create in-memory database connection stored in session state."""
     if "db_conn" not in st.session_state:
-        conn = sqlite3.connect(":memory:", check_same_thread=False)
-        conn.row_factory = sqlite3.Row
-        _init_schema(conn)
-        st.session_state.db_conn = conn
+        with _connect_lock:
+            if "db_conn" not in st.session_state:
+                conn = sqlite3.connect(":memory:", check_same_thread=False)
+                conn.row_factory = sqlite3.Row
+                _init_schema(conn)
+                # Real-time mode works on several pages at once, and their worker
+                # threads share this connection; every operation (statements +
+                # commit) holds the connection's lock so one thread's commit
+                # can't land in the middle of another's write
+                st.session_state.db_lock = threading.RLock()
+                st.session_state.db_conn = conn
     return st.session_state.db_conn
 
 
+def _serialized(func):
+    """Run a database operation under the session connection's lock."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        get_connection()  # Creates the lock along with the connection
+        with st.session_state.db_lock:
+            return func(*args, **kwargs)
+    return wrapper
+
+
 def _init_schema(conn: sqlite3.Connection) -> None:
     """Initialize database schema."""
     conn.executescript("""
@@ -30,7 +59,7 @@ def _init_schema(conn: sqlite3.Connection) -> None:
             -- Input
             original_filename TEXT NOT NULL,
 
-            -- Deduplication (first 100 chars of extracted text)
+            -- Deduplication (hash of the extracted text)
             text_fingerprint TEXT,
 
             -- Extracted & translated content
@@ -54,7 +83,8 @@ def _init_schema(conn: sqlite3.Connection) -> None:
             completed_at TIMESTAMP
         );
 
-        CREATE INDEX IF NOT EXISTS idx_fingerprint ON pages(text_fingerprint);
+        -- check_duplicate looks up (fingerprint, status) on every page
+        CREATE INDEX IF NOT EXISTS idx_fp_status ON pages(text_fingerprint, status);
         CREATE INDEX IF NOT EXISTS idx_status ON pages(status);
 
         CREATE TABLE IF NOT EXISTS batch_jobs (
@@ -71,13 +101,44 @@ def _init_schema(conn: sqlite3.Connection) -> None:
     conn.commit()
 
 
+def _query_cache() -> dict:
+    """Per-session cache of read query results, cleared on every write."""
+    if "db_query_cache" not in st.session_state:
+        st.session_state.db_query_cache = {}
+    return st.session_state.db_query_cache
+
+
+def _commit(conn: sqlite3.Connection) -> None:
+    """Commit a write and drop cached read results."""
+    conn.commit()
+    _query_cache().clear()
+
+
+def _cached_query(func):
+    """Cache a no-argument read query until the next write."""
+    @functools.wraps(func)
+    def wrapper():
+        flush_errors()  # Make sure buffered errors are visible to readers
+        cache = _query_cache()
+        if func.__name__ not in cache:
+            cache[func.__name__] = func()
+        return cache[func.__name__]
+    return wrapper
+
+
 def get_fingerprint(text: str) -> str:
-    """Generate fingerprint from first 100 characters of text."""
-    if not text or not text.strip():
+    """
+    Generate fingerprint from a hash of the whole extracted text.
+    Pages that only share an opening (e.g. a repeated chapter header) are
+    not treated as duplicates, and index keys stay a fixed 32 characters.
+    """
+    text = text.strip() if text else ""
+    if not text:
         return "EMPTY_PAGE"
-    return text.strip()[:100]
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
 
 
+@_serialized
 def check_duplicate(fingerprint: str) -> Optional[int]:
     """
     Check if a page with this fingerprint already exists.
@@ -91,6 +152,7 @@ def check_duplicate(fingerprint: str) -> Optional[int]:
     return row["id"] if row else None
 
 
+@_serialized
 def register_page(
     filename: str,
     fingerprint: str,
@@ -105,10 +167,11 @@ def register_page(
            VALUES (?, ?, ?, ?, 'processing')""",
         (filename, fingerprint, extracted_text, json.dumps(translations))
     )
-    conn.commit()
+    _commit(conn)
     return cursor.lastrowid
 
 
+@_serialized
 def record_duplicate(filename: str, fingerprint: str, duplicate_of_id: int) -> int:
     """Record a page as duplicate of another. Returns page ID."""
     conn = get_connection()
@@ -117,10 +180,32 @@ def record_duplicate(filename: str, fingerprint: str, duplicate_of_id: int) -> i
            VALUES (?, ?, 'duplicate', ?)""",
         (filename, fingerprint, duplicate_of_id)
     )
-    conn.commit()
+    _commit(conn)
     return cursor.lastrowid
 
 
+@_serialized
+def register_or_record_duplicate(
+    filename: str,
+    fingerprint: str,
+    extracted_text: str,
+    translations: list
+) -> tuple[Optional[int], Optional[int]]:
+    """
+    Register a page, or record it as a duplicate of an existing one, as one
+    step so no other thread can register the same fingerprint in between.
+    Returns (page_id, None) for a new page or (None, duplicate_of_id).
+    Identical pages processed at the same time are all registered here;
+    complete_page sorts out which of them is the original.
+    """
+    existing_id = check_duplicate(fingerprint)
+    if existing_id:
+        record_duplicate(filename, fingerprint, existing_id)
+        return None, existing_id
+    return register_page(filename, fingerprint, extracted_text, translations), None
+
+
+@_serialized
 def mark_completed(page_id: int, status: str = "completed") -> None:
     """Mark a page as completed or needs_review."""
     conn = get_connection()
@@ -128,9 +213,37 @@ def mark_completed(page_id: int, status: str = "completed") -> None:
         "UPDATE pages SET status = ?, completed_at = ? WHERE id = ?",
         (status, datetime.now().isoformat(), page_id)
     )
-    conn.commit()
+    _commit(conn)
 
 
+@_serialized
+def complete_page(page_id: int, fingerprint: str) -> Optional[int]:
+    """
+    Mark a registered page completed - unless another page with the same
+    fingerprint completed while this one was in flight, in which case this
+    page becomes a duplicate of it. Only a completed page is ever used as
+    the original. Returns the original's page ID for a duplicate, else None.
+    """
+    conn = get_connection()
+    row = conn.execute(
+        "SELECT id FROM pages WHERE text_fingerprint = ? AND status = 'completed' AND id != ?",
+        (fingerprint, page_id)
+    ).fetchone()
+    if row:
+        conn.execute(
+            "UPDATE pages SET status = 'duplicate', duplicate_of_id = ?, completed_at = ? WHERE id = ?",
+            (row["id"], datetime.now().isoformat(), page_id)
+        )
+    else:
+        conn.execute(
+            "UPDATE pages SET status = 'completed', completed_at = ? WHERE id = ?",
+            (datetime.now().isoformat(), page_id)
+        )
+    _commit(conn)
+    return row["id"] if row else None
+
+
+@_serialized
 def mark_failed(page_id: int, error: str) -> None:
     """Mark a page as failed with error message."""
     conn = get_connection()
@@ -139,20 +252,49 @@ def mark_failed(page_id: int, error: str) -> None:
            retry_count = retry_count + 1 WHERE id = ?""",
         (error, page_id)
     )
-    conn.commit()
+    _commit(conn)
+
+
+def _error_buffer() -> list:
+    """Per-session buffer of (filename, error) rows not yet written."""
+    if "db_error_buffer" not in st.session_state:
+        st.session_state.db_error_buffer = []
+        st.session_state.db_error_flushed_at = 0.0
+    return st.session_state.db_error_buffer
 
 
 def log_error(filename: str, error: str) -> None:
-    """Log an error for a page that failed before registration."""
+    """
+    Log an error for a page that failed before registration.
+    Rows are buffered and written in batches; reads flush them first.
+    """
+    buffer = _error_buffer()
+    buffer.append((filename, error))
+
+    since_flush = time.monotonic() - st.session_state.db_error_flushed_at
+    if len(buffer) >= ERROR_FLUSH_SIZE or since_flush >= ERROR_FLUSH_INTERVAL:
+        flush_errors()
+
+
+@_serialized
+def flush_errors() -> None:
+    """Write all buffered error rows in a single transaction."""
+    buffer = _error_buffer()
+    if not buffer:
+        return
+
     conn = get_connection()
-    conn.execute(
+    conn.executemany(
         """INSERT INTO pages (original_filename, status, last_error)
            VALUES (?, 'failed', ?)""",
-        (filename, error)
+        buffer
     )
-    conn.commit()
+    buffer.clear()
+    _commit(conn)
+    st.session_state.db_error_flushed_at = time.monotonic()
 
 
+@_serialized
 def update_verification_status(page_id: int, passed: bool, issues: list) -> None:
     """Update verification status for a page."""
     conn = get_connection()
@@ -160,9 +302,11 @@ def update_verification_status(page_id: int, passed: bool, issues: list) -> None
         "UPDATE pages SET verification_passed = ?, verification_issues = ? WHERE id = ?",
         (passed, json.dumps(issues) if issues else None, page_id)
     )
-    conn.commit()
+    _commit(conn)
 
 
+@_cached_query
+@_serialized
 def get_verification_issues() -> list[dict]:
     """Get all pages that failed verification."""
     conn = get_connection()
@@ -178,6 +322,8 @@ def get_verification_issues() -> list[dict]:
     ]
 
 
+@_cached_query
+@_serialized
 def get_failed_pages() -> list[dict]:
     """Get all pages that failed processing."""
     conn = get_connection()
@@ -191,21 +337,25 @@ def get_failed_pages() -> list[dict]:
     ]
 
 
+@_cached_query
+@_serialized
 def get_stats() -> dict:
     """Get processing statistics."""
     conn = get_connection()
 
-    stats = {}
-    for status in ["pending", "processing", "completed", "failed", "duplicate"]:
-        count = conn.execute(
-            "SELECT COUNT(*) FROM pages WHERE status = ?", (status,)
-        ).fetchone()[0]
-        stats[status] = count
+    stats = dict.fromkeys(["pending", "processing", "completed", "failed", "duplicate"], 0)
+    rows = conn.execute(
+        "SELECT status, COUNT(*) FROM pages GROUP BY status"
+    ).fetchall()
+    for status, count in rows:
+        if status in stats:
+            stats[status] = count
 
     return stats
 
 
 # Batch job functions
+@_serialized
 def save_batch_job(job_id: str, total_pages: int, verify: bool = False) -> int:
     """Save a batch job record. Returns job record ID."""
     conn = get_connection()
@@ -214,10 +364,11 @@ def save_batch_job(job_id: str, total_pages: int, verify: bool = False) -> int:
            VALUES (?, ?, ?, 'pending')""",
         (job_id, total_pages, verify)
     )
-    conn.commit()
+    _commit(conn)
     return cursor.lastrowid
 
 
+@_serialized
 def get_batch_job(job_id: str) -> Optional[dict]:
     """Get batch job by job ID."""
     conn = get_connection()
@@ -227,6 +378,7 @@ def get_batch_job(job_id: str) -> Optional[dict]:
     return dict(row) if row else None
 
 
+@_serialized
 def update_batch_job_status(job_id: str, status: str, completed_pages: int = None) -> None:
     """Update batch job status."""
     conn = get_connection()
@@ -240,11 +392,17 @@ def update_batch_job_status(job_id: str, status: str, completed_pages: int = Non
             "UPDATE batch_jobs SET status = ? WHERE job_id = ?",
             (status, job_id)
         )
-    conn.commit()
+    _commit(conn)
 
 
+@_serialized
 def reset_database() -> None:
     """Reset the database (clear all data)."""
-    if "db_conn" in st.session_state:
-        del st.session_state.db_conn
-    get_connection()  # Reinitialize
+    _error_buffer().clear()
+    conn = get_connection()
+    # Empty the tables in place instead of rebuilding the schema; clearing
+    # sqlite_sequence restarts the AUTOINCREMENT ids like a fresh database
+    conn.execute("DELETE FROM pages")
+    conn.execute("DELETE FROM batch_jobs")
+    conn.execute("DELETE FROM sqlite_sequence")
+    _commit(conn)
@@ -3,59 +3,47 @@ Core translation logic for Book Translator.
 Handles text extraction, translation, and image editing using Google Gemini.
 """
 
+import io
 import json
+import logging
+import os
 import re
-from typing import Optional
+from typing import Iterable, Iterator, Optional
 
 import streamlit as st
 from google import genai
+from google.genai import errors as genai_errors
 from google.genai import types
 from PIL import Image
-from tenacity import retry, stop_after_attempt, wait_exponential
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_random_exponential
 
 from database import (
     get_fingerprint,
-    check_duplicate,
-    register_page,
-    record_duplicate,
+    register_or_record_duplicate,
+    complete_page,
     mark_completed,
     mark_failed,
     update_verification_status,
 )
+from utils import MAX_CONCURRENT_PAGES, PageResultCache, image_content_hash, ordered_map
 
+logger = logging.getLogger(__name__)
 
 # Model IDs
 MODEL_EXTRACTION = "gemini-2.5-flash"
 MODEL_IMAGE_EDIT = "gemini-2.0-flash-exp"  # Image generation model
 
+# Bounds for the extract_and_translate result cache
+EXTRACTION_CACHE_MAX_ENTRIES = 2000
+EXTRACTION_CACHE_TTL = 24 * 60 * 60  # seconds
 
-def get_client() -> genai.Client:
-    """Get Gemini client with API key from Streamlit secrets."""
-    return genai.Client(api_key=st.secrets["GEMINI_API_KEY"])
-
-
-def parse_json_response(text: str) -> dict:
-    """Parse JSON from Gemini response, handling markdown code blocks."""
-    # Remove markdown code blocks if present
-    text = text.strip()
-    if text.startswith("```"):
-        # Remove opening ```json or ```
-        text = re.sub(r"^```\w*\n?", "", text)
-        # Remove closing ```
-        text = re.sub(r"\n?```$", "", text)
-
-    return json.loads(text)
+# Opt-in (FUSED_EDIT=1): extract, translate and edit each page in one call to the
+# experimental image model instead of an extraction call plus an edit call
+FUSED_EDIT = os.environ.get("FUSED_EDIT", "0") == "1"
 
-
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(min=4, max=60))
-def extract_and_translate(image: Image.Image) -> dict:
-    """
-    Single API call: Extract English text AND translate to Hebrew.
-    Returns dict with 'extracted_text' and 'translations' list.
-    """
-    client = get_client()
-
-    prompt = '''
+# Prompts
+EXTRACTION_PROMPT = '''
     1. Extract ALL English text from this image exactly as written.
     2. Translate each text element to Hebrew.
 
@@ -73,32 +61,8 @@ def extract_and_translate(image: Image.Image) -> dict:
     {"extracted_text": "", "translations": []}
     '''
 
-    response = client.models.generate_content(
-        model=MODEL_EXTRACTION,
-        contents=[prompt, image]
-    )
-
-    return parse_json_response(response.text)
-
-
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(min=4, max=60))
-def edit_image_with_hebrew(image: Image.Image, translations: list) -> Image.Image:
-    """
-    EDIT the original image - replace English text with Hebrew.
-    Uses Gemini's image generation capabilities.
-    """
-    client = get_client()
-
-    if not translations:
-        # No text to translate, return original
-        return image
-
-    replacements = "\n".join([
-        f'• "{t["english"]}" → "{t["hebrew"]}"'
-        for t in translations
-    ])
-
-    prompt = f'''
+# Filled in per page with the text replacements
+EDIT_PROMPT_TEMPLATE = '''
     EDIT THIS IMAGE - DO NOT REGENERATE IT.
 
     This is a text replacement task. Take the uploaded image and replace
@@ -127,33 +91,45 @@ def edit_image_with_hebrew(image: Image.Image, translations: list) -> Image.Imag
     {replacements}
     '''
 
-    response = client.models.generate_content(
-        model=MODEL_IMAGE_EDIT,
-        contents=[prompt, image],
-        config=types.GenerateContentConfig(
-            response_modalities=['TEXT', 'IMAGE']
-        )
-    )
+# Extraction and edit in one call: the response carries the JSON and the edited image
+FUSED_PROMPT = '''
+    This is a text replacement task with two outputs.
 
-    # Extract image from response
-    for part in response.candidates[0].content.parts:
-        if part.inline_data is not None:
-            import io
-            image_bytes = part.inline_data.data
-            return Image.open(io.BytesIO(image_bytes))
+    1. Extract ALL English text from this image exactly as written and
+       translate each text element to Hebrew. Return JSON:
+    {
+        "extracted_text": "full original English text here...",
+        "translations": [
+            {"english": "...", "hebrew": "..."},
+            ...
+        ]
+    }
 
-    raise RuntimeError("No image in response from Gemini")
+    2. EDIT THIS IMAGE - DO NOT REGENERATE IT. Replace the English text with
+    your Hebrew translations. Everything else must remain EXACTLY as it is
+    in the original:
 
+    ✓ Keep the EXACT same illustrations and cartoon characters
+    ✓ Keep the EXACT same layout and positioning
+    ✓ Keep the EXACT same colors and backgrounds
+    ✓ Keep the EXACT same decorative elements
+    ✗ Do NOT redraw or reimagine any part of the image
+    ✗ Do NOT change anything except the text
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(min=4, max=60))
-def verify_translation(original: Image.Image, translated: Image.Image) -> dict:
-    """
-    Compare original and translated images to catch issues.
-    Returns verification result with pass/fail and reasons.
-    """
-    client = get_client()
+    HEBREW TEXT POSITIONING (RTL RULES):
+    - Hebrew reads RIGHT-TO-LEFT
+    - Titles: Keep centered if originally centered
+    - Paragraphs: Flip alignment (left-aligned English → right-aligned Hebrew)
+    - Lists/bullet points: Bullets move to the RIGHT side of text
+    - Text boxes: Text starts from the RIGHT edge
+    - Numbers in recipes (½ cup, 350°F): Keep as-is, they appear correctly in RTL
+    - Keep text in the SAME position/area as the original English
 
-    prompt = '''
+    If there is no text in the image, return only:
+    {"extracted_text": "", "translations": []}
+    '''
+
+VERIFY_PROMPT = '''
     Compare these two images. The first is the original (English),
     the second is the translated version (Hebrew).
 
@@ -174,9 +150,186 @@ def verify_translation(original: Image.Image, translated: Image.Image) -> dict:
     false positives than miss real issues.
     '''
 
+# Everything besides the page itself that shapes a translated page. Part of the
+# page cache key, so changing a model or prompt doesn't serve stale pages
+PAGE_CACHE_CONTEXT = (
+    MODEL_EXTRACTION,
+    MODEL_IMAGE_EDIT,
+    EXTRACTION_PROMPT,
+    EDIT_PROMPT_TEMPLATE,
+    FUSED_PROMPT if FUSED_EDIT else "",
+)
+
+# Markdown code fences Gemini sometimes wraps JSON responses in
+_FENCE_OPEN = re.compile(r"^```\w*\n?")
+_FENCE_CLOSE = re.compile(r"\n?```$")
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    """
+    Client errors other than rate limiting (bad request, auth) fail the same
+    way every time, and so does parsing (ValueError, incl. JSONDecodeError).
+    """
+    if isinstance(exc, genai_errors.ClientError):
+        return exc.code == 429
+    if isinstance(exc, ValueError):
+        return False
+    return True
+
+
+# Gemini calls retry up to 3 times with jittered backoff, so pages that hit a
+# rate limit together don't all retry at the same moment
+_api_retry = retry(
+    stop=stop_after_attempt(3),
+    wait=wait_random_exponential(multiplier=4, min=1, max=60),
+    retry=retry_if_exception(_is_retryable),
+)
+
+
+@st.cache_resource
+def get_client() -> genai.Client:
+    """
+    Get Gemini client with API key from Streamlit secrets.
+    Cached so every page and rerun reuses one client and its connection pool.
+    """
+    return genai.Client(api_key=st.secrets["GEMINI_API_KEY"])
+
+
+def parse_json_response(text: str) -> dict:
+    """Parse JSON from Gemini response, handling markdown code blocks."""
+    # Remove markdown code blocks if present
+    text = text.strip()
+    if text.startswith("```"):
+        # Remove opening ```json or ```
+        text = _FENCE_OPEN.sub("", text, count=1)
+        # Remove closing ```
+        text = _FENCE_CLOSE.sub("", text, count=1)
+
+    return json.loads(text)
+
+
+def extract_and_translate(image: Image.Image, image_hash: Optional[str] = None) -> dict:
+    """
+    Single API call: Extract English text AND translate to Hebrew.
+    Returns dict with 'extracted_text' and 'translations' list.
+    Results are cached by image content (up to EXTRACTION_CACHE_MAX_ENTRIES
+    pages, for EXTRACTION_CACHE_TTL), so re-uploads and reruns of the same
+    page skip the API call. The fused call (FUSED_EDIT) does not go through
+    this cache; it is used by the separate-call path and its fallbacks.
+    Pass image_hash (image_content_hash) if it is already known.
+    """
+    if image_hash is None:
+        image_hash = image_content_hash(image)
+    return _cached_extract_and_translate(image_hash, image)
+
+
+# In memory rather than persist="disk": Streamlit ignores ttl for persisted
+# caches and never deletes their files, so the disk copy would grow forever.
+# Finished pages are kept on disk per session in PageResultCache instead.
+@st.cache_data(max_entries=EXTRACTION_CACHE_MAX_ENTRIES, ttl=EXTRACTION_CACHE_TTL, show_spinner=False)
+def _cached_extract_and_translate(image_hash: str, _image: Image.Image) -> dict:
+    """Cache wrapper keyed on image_hash (the leading underscore keeps _image out of the key)."""
+    return _request_extract_and_translate(_image)
+
+
+@_api_retry
+def _request_extract_and_translate(image: Image.Image) -> dict:
+    """Call Gemini to extract and translate the page text."""
+    client = get_client()
+
     response = client.models.generate_content(
         model=MODEL_EXTRACTION,
-        contents=[prompt, original, translated]
+        contents=[EXTRACTION_PROMPT, image]
+    )
+
+    return parse_json_response(response.text)
+
+
+@_api_retry
+def edit_image_with_hebrew(image: Image.Image, translations: list) -> Image.Image:
+    """
+    EDIT the original image - replace English text with Hebrew.
+    Uses Gemini's image generation capabilities.
+    """
+    client = get_client()
+
+    if not translations:
+        # No text to translate, return original
+        return image
+
+    replacements = "\n".join([
+        f'• "{t["english"]}" → "{t["hebrew"]}"'
+        for t in translations
+    ])
+
+    prompt = EDIT_PROMPT_TEMPLATE.format(replacements=replacements)
+
+    response = client.models.generate_content(
+        model=MODEL_IMAGE_EDIT,
+        contents=[prompt, image],
+        config=types.GenerateContentConfig(
+            response_modalities=['TEXT', 'IMAGE']
+        )
+    )
+
+    # Extract image from response
+    for part in response.candidates[0].content.parts:
+        if part.inline_data is not None:
+            # Decode now, so a corrupt image fails inside the retry and the
+            # response bytes can be released when this returns
+            edited = Image.open(io.BytesIO(part.inline_data.data))
+            edited.load()
+            return edited
+
+    raise RuntimeError("No image in response from Gemini")
+
+
+def extract_translate_and_edit(image: Image.Image) -> tuple[Optional[dict], Optional[Image.Image]]:
+    """
+    Single API call: extract + translate the text AND edit the image.
+    Returns (extraction, edited_image); either is None if the response
+    is missing that part, so the caller can fall back to separate calls.
+    Not retried: on failure the caller goes straight to the separate
+    (retried) calls rather than spending attempts here first.
+    """
+    client = get_client()
+
+    response = client.models.generate_content(
+        model=MODEL_IMAGE_EDIT,
+        contents=[FUSED_PROMPT, image],
+        config=types.GenerateContentConfig(
+            response_modalities=['TEXT', 'IMAGE']
+        )
+    )
+
+    text_parts = []
+    edited = None
+    for part in response.candidates[0].content.parts:
+        if part.inline_data is not None and edited is None:
+            edited = Image.open(io.BytesIO(part.inline_data.data))
+            edited.load()
+        elif part.text:
+            text_parts.append(part.text)
+
+    try:
+        extraction = parse_json_response("".join(text_parts))
+    except ValueError:
+        extraction = None
+
+    return extraction, edited
+
+
+@_api_retry
+def verify_translation(original: Image.Image, translated: Image.Image) -> dict:
+    """
+    Compare original and translated images to catch issues.
+    Returns verification result with pass/fail and reasons.
+    """
+    client = get_client()
+
+    response = client.models.generate_content(
+        model=MODEL_EXTRACTION,
+        contents=[VERIFY_PROMPT, original, translated]
     )
 
     return parse_json_response(response.text)
@@ -185,11 +338,16 @@ def verify_translation(original: Image.Image, translated: Image.Image) -> dict:
 def process_single_page(
     image: Image.Image,
     filename: str,
-    verify: bool = False
+    verify: bool = False,
+    cache: Optional[PageResultCache] = None,
 ) -> dict:
     """
     Process one page end-to-end.
     Returns dict with status, translated_image, and optional verification result.
+
+    With a cache, a page translated before skips the API calls but is still
+    recorded in the database like any other page (including its cached
+    verification); new results are added to the cache.
     """
     result = {
         "status": "completed",
@@ -199,41 +357,64 @@ def process_single_page(
         "error": None
     }
 
+    page_id = None
     try:
-        # Step 1: Extract + Translate (one API call)
-        extraction = extract_and_translate(image)
+        image_hash = image_content_hash(image)
+        translated_image = None
+        extraction = None
+        verification = None
+
+        cache_key = cached = None
+        if cache is not None:
+            cache_key = cache.page_key(image_hash, *PAGE_CACHE_CONTEXT, VERIFY_PROMPT if verify else "")
+            cached = cache.get(cache_key)
+            if cached is not None:
+                # Translated before - reuse the page, its text and its verification
+                translated_image, meta = cached
+                extraction = meta["extraction"]
+                verification = meta["verification"]
+
+        # Step 1: Extract + Translate (one API call, which also edits the
+        # image when FUSED_EDIT is on)
+        if extraction is None and FUSED_EDIT:
+            try:
+                extraction, translated_image = extract_translate_and_edit(image)
+            except Exception as e:
+                logger.warning(f"Fused call failed for {filename}, using separate calls: {e}")
+        if extraction is None:
+            # The re-fetched translations may differ from whatever the fused
+            # image was drawn from, so drop it and edit from these instead
+            translated_image = None
+            extraction = extract_and_translate(image, image_hash)
         extracted_text = extraction.get("extracted_text", "")
         translations = extraction.get("translations", [])
 
-        # Step 2: Dedup check
+        # Steps 2-3: Dedup check, then register in DB (if not duplicate).
+        # One atomic call, since other pages are being registered concurrently
         fingerprint = get_fingerprint(extracted_text)
-        existing_id = check_duplicate(fingerprint)
+        page_id, existing_id = register_or_record_duplicate(
+            filename, fingerprint, extracted_text, translations
+        )
 
         if existing_id:
-            record_duplicate(filename, fingerprint, existing_id)
             result["status"] = "duplicate"
             result["is_duplicate"] = True
             # For duplicates, we still need to process the image
             # (the duplicate check is just for tracking)
 
-        # Step 3: Register in DB (if not duplicate)
-        if not existing_id:
-            page_id = register_page(filename, fingerprint, extracted_text, translations)
-        else:
-            page_id = None
-
         # Step 4: Edit image (replace English text with Hebrew)
-        if translations:
-            translated_image = edit_image_with_hebrew(image, translations)
-        else:
+        if not translations:
             # No text to translate, use original
             translated_image = image
+        elif translated_image is None:
+            translated_image = edit_image_with_hebrew(image, translations)
 
         result["translated_image"] = translated_image
 
         # Step 5: Optional verification
         if verify and translations:
-            verification = verify_translation(image, translated_image)
+            if verification is None:
+                verification = verify_translation(image, translated_image)
             result["verification"] = verification
 
             if page_id:
@@ -249,13 +430,64 @@ def process_single_page(
                     mark_completed(page_id, status="needs_review")
                 return result
 
-        # Mark as completed
-        if page_id:
-            mark_completed(page_id)
+        # Mark as completed (or as a duplicate of an identical page that
+        # finished first while this one was in flight)
+        if page_id and complete_page(page_id, fingerprint):
+            result["status"] = "duplicate"
+            result["is_duplicate"] = True
+
+        if cache_key is not None and cached is None:
+            try:
+                cache.put(cache_key, translated_image, {
+                    "extraction": {"extracted_text": extracted_text, "translations": translations},
+                    "verification": verification,
+                })
+            except Exception as e:
+                logger.warning(f"Could not cache {filename}: {e}")
 
         return result
 
     except Exception as e:
         result["status"] = "failed"
         result["error"] = str(e)
+        if page_id:
+            # Don't leave the row 'processing'
+            mark_failed(page_id, str(e))
         return result
+
+
+def process_pages_concurrently(
+    pages: Iterable[tuple[str, Image.Image]],
+    verify: bool = False,
+    max_workers: int = MAX_CONCURRENT_PAGES,
+    cache: Optional[PageResultCache] = None,
+) -> Iterator[tuple[str, dict]]:
+    """
+    Process pages with up to max_workers pages in flight at once.
+    Pages are pulled from the iterable lazily, so only a handful of images
+    are held in memory. Yields (filename, result) tuples in page order.
+
+    Up to 2 * max_workers pages are queued, so one slow page at the head of
+    the line doesn't leave the other workers idle while its result is awaited.
+
+    With a cache, pages translated before in this session skip the API
+    calls (see process_single_page).
+
+    Pages given as (filename, None) (failed to decode) are yielded as
+    failed results, so every input page gets exactly one output.
+    """
+    def process_page(page: tuple[str, Optional[Image.Image]]) -> tuple[str, dict]:
+        filename, image = page
+        if image is None:
+            # Failed to decode upstream - report it in place so page order holds
+            return filename, {
+                "status": "failed",
+                "translated_image": None,
+                "verification": None,
+                "is_duplicate": False,
+                "error": "Could not decode image"
+            }
+        return filename, process_single_page(image, filename, verify=verify, cache=cache)
+
+    # Workers need the script context to reach st.session_state (DB connection)
+    yield from ordered_map(process_page, pages, workers=max_workers, ctx=get_script_run_ctx())
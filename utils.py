@@ -3,33 +3,88 @@ Utility functions for Book Translator.
 Handles ZIP creation, image loading, and other helpers.
 """
 
+import bisect
+import functools
+import hashlib
 import io
+import itertools
+import json
 import logging
 import os
+import re
 import shutil
 import tempfile
+import threading
 import zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import BinaryIO
+from typing import BinaryIO, Iterable, Iterator
 
 from PIL import Image
+from streamlit.runtime.scriptrunner import add_script_run_ctx
 
 # Configure logging
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=os.environ.get("LOG_LEVEL", "INFO").upper(),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
+# Pages translated at once in real-time mode (kept low for Gemini rate limits;
+# raise it with the MAX_CONCURRENT_PAGES env var if your quota allows)
+MAX_CONCURRENT_PAGES = max(1, int(os.environ.get("MAX_CONCURRENT_PAGES", "4")))
+
+# Average wall time for one page (extract + translate + edit) when run alone
+ESTIMATED_SECONDS_PER_PAGE = 12
+
+# The ETA averages the last ETA_WINDOW page times; at most PAGE_TIME_HISTORY are kept
+ETA_WINDOW = 10
+PAGE_TIME_HISTORY = 500
+
+# TempResultStorage encodes results on background threads, with at most
+# this many queued (each queued write holds a decoded image in memory)
+RESULT_WRITER_THREADS = 2
+MAX_PENDING_RESULT_WRITES = 4
+
+# Least recently used pages are evicted once a session's page cache grows past this size
+PAGE_CACHE_MAX_BYTES = max(0, int(os.environ.get("PAGE_CACHE_MAX_MB", "512"))) << 20
+
+# zlib level for PNGs handed to the user (optimize=True would retry at level 9
+# for a few percent smaller files at several times the encode time)
+RESULT_PNG_COMPRESS_LEVEL = 6
+# zlib level for PNGs only this app reads back (staged batch pages, page cache)
+SCRATCH_PNG_COMPRESS_LEVEL = 1
+
+# Pages are downscaled to fit this box on load (Gemini works at lower resolution)
+MAX_IMAGE_DIM = 2048
+
+# Bounding box for page preview thumbnails (2x the 120px display width)
+PREVIEW_THUMB_SIZE = (240, 320)
+
+# Page image types accepted in uploads and ZIP files
+_IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+# PIL decoders for those extensions; Image.open only tries these
+_IMAGE_FORMATS = ("PNG", "JPEG", "WEBP")
+
+# Pages decoded ahead of the consumer by stream_images_from_zip / _from_uploads
+ZIP_DECODE_WORKERS = 4
+UPLOAD_DECODE_AHEAD = 1
+# Batch submission decodes every page up front, so it uses more threads
+BATCH_DECODE_WORKERS = 4
+
+# Splits "page_10.png" into ["page_", "10", ".png"] for natural sorting
+_DIGITS_SPLIT = re.compile(r"(\d+)").split
+
 
 # =============================================================================
 # Progress Tracking for Mobile-Friendly Upload
 # =============================================================================
 
-@dataclass
+@dataclass(slots=True)
 class BatchInfo:
-    """Information about a single batch."""
+    """Information about a single batch (slotted: read on every progress repaint)."""
     batch_num: int
     start_idx: int
     end_idx: int
@@ -59,9 +114,13 @@ class UploadProgress:
     phase: str = "idle"  # idle, uploading, processing, verifying, complete, paused
     batches: list = field(default_factory=list)
     start_time: float = 0
-    pages_processed_times: list = field(default_factory=list)  # For ETA calculation
+    pages_processed_times: deque = field(default_factory=lambda: deque(maxlen=PAGE_TIME_HISTORY))
+    recent_page_times: deque = field(default_factory=lambda: deque(maxlen=ETA_WINDOW))
+    recent_time_total: float = 0.0  # Running sum of recent_page_times
     is_paused: bool = False
     error_message: str = ""
+    # (inputs, text) of the last format_eta call, reused until a page completes
+    _eta_cache: tuple | None = field(default=None, repr=False, compare=False)
 
     @property
     def overall_progress(self) -> float:
@@ -78,34 +137,48 @@ class UploadProgress:
         batch = self.batches[self.current_batch]
         return batch.progress * 100
 
+    def add_page_time(self, seconds: float) -> None:
+        """Record how long a page took, keeping the rolling ETA sum up to date."""
+        if len(self.recent_page_times) == ETA_WINDOW:
+            self.recent_time_total -= self.recent_page_times[0]
+        self.recent_page_times.append(seconds)
+        self.recent_time_total += seconds
+        self.pages_processed_times.append(seconds)
+
     def get_eta_seconds(self) -> int | None:
         """Estimate remaining time in seconds based on rolling average."""
-        if len(self.pages_processed_times) < 2:
+        if len(self.recent_page_times) < 2:
             return None
 
-        # Use last 10 page times for rolling average
-        recent_times = self.pages_processed_times[-10:]
-        avg_time_per_page = sum(recent_times) / len(recent_times)
+        # Rolling average over the last ETA_WINDOW page times
+        avg_time_per_page = self.recent_time_total / len(self.recent_page_times)
 
         remaining_pages = self.total_pages - self.current_page
         return int(remaining_pages * avg_time_per_page)
 
     def format_eta(self) -> str:
         """Format ETA as human-readable string."""
+        # The ETA only moves when a page completes, not on every repaint
+        key = (self.current_page, self.total_pages, len(self.recent_page_times), self.recent_time_total)
+        if self._eta_cache is not None and self._eta_cache[0] == key:
+            return self._eta_cache[1]
+
         eta = self.get_eta_seconds()
         if eta is None:
-            return "Calculating..."
-
-        if eta < 60:
-            return f"{eta}s"
+            text = "Calculating..."
+        elif eta < 60:
+            text = f"{eta}s"
         elif eta < 3600:
             mins = eta // 60
             secs = eta % 60
-            return f"{mins}m {secs}s"
+            text = f"{mins}m {secs}s"
         else:
             hours = eta // 3600
             mins = (eta % 3600) // 60
-            return f"{hours}h {mins}m"
+            text = f"{hours}h {mins}m"
+
+        self._eta_cache = (key, text)
+        return text
 
 
 def create_batches(total_pages: int, batch_size: int = 20) -> list[BatchInfo]:
@@ -158,37 +231,75 @@ def init_upload_progress(total_pages: int, batch_size: int = 20) -> UploadProgre
         phase="processing",
         batches=batches,
         start_time=time.time(),
-        pages_processed_times=[],
         is_paused=False,
     )
 
 
+_PHASE_ICONS = {
+    "idle": "⏸️",
+    "uploading": "📤",
+    "processing": "⚙️",
+    "verifying": "🔍",
+    "complete": "✅",
+    "paused": "⏸️",
+    "failed": "❌",
+}
+
+_PHASE_LABELS = {
+    "idle": "Ready",
+    "uploading": "Uploading",
+    "processing": "Translating",
+    "verifying": "Verifying",
+    "complete": "Complete",
+    "paused": "Paused",
+    "failed": "Failed",
+}
+
+
 def get_phase_icon(phase: str) -> str:
     """Get icon for current processing phase."""
-    icons = {
-        "idle": "⏸️",
-        "uploading": "📤",
-        "processing": "⚙️",
-        "verifying": "🔍",
-        "complete": "✅",
-        "paused": "⏸️",
-        "failed": "❌",
-    }
-    return icons.get(phase, "⏳")
+    return _PHASE_ICONS.get(phase, "⏳")
 
 
 def get_phase_label(phase: str) -> str:
     """Get human-readable label for current processing phase."""
-    labels = {
-        "idle": "Ready",
-        "uploading": "Uploading",
-        "processing": "Translating",
-        "verifying": "Verifying",
-        "complete": "Complete",
-        "paused": "Paused",
-        "failed": "Failed",
-    }
-    return labels.get(phase, "Processing")
+    return _PHASE_LABELS.get(phase, "Processing")
+
+
+def _to_rgb(image: Image.Image) -> Image.Image:
+    """Convert to RGB if necessary, flattening transparency (RGBA, P mode) onto white."""
+    if image.mode in ("RGBA", "P"):
+        if image.mode == "P":
+            image = image.convert("RGBA")
+        # getchannel reads only the alpha band
+        alpha = image.getchannel("A")
+        if alpha.getextrema()[0] == 255:
+            # Fully opaque (e.g. a pre-flattened export) - nothing to composite
+            return image.convert("RGB")
+        # Create white background for transparency
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=alpha)
+        return background
+    if image.mode != "RGB":
+        return image.convert("RGB")
+    return image
+
+
+def _decode_page_image(fp: BinaryIO | str) -> Image.Image:
+    """
+    Decode a page image, downscaled to fit MAX_IMAGE_DIM, in RGB mode.
+    JPEGs are decoded at reduced size via PIL's draft mode instead of
+    decoding full resolution and shrinking afterwards.
+    """
+    image = Image.open(fp, formats=_IMAGE_FORMATS)
+    image.draft("RGB", (MAX_IMAGE_DIM, MAX_IMAGE_DIM))
+    image.load()
+
+    image = _to_rgb(image)
+
+    # No-op when the page already fits
+    image.thumbnail((MAX_IMAGE_DIM, MAX_IMAGE_DIM), Image.Resampling.LANCZOS)
+    return image
 
 
 def load_image_from_upload(uploaded_file: BinaryIO) -> Image.Image:
@@ -196,80 +307,145 @@ def load_image_from_upload(uploaded_file: BinaryIO) -> Image.Image:
     Convert Streamlit uploaded file to PIL Image.
     Handles various image formats and ensures RGB mode.
     """
-    image = Image.open(uploaded_file)
+    return _decode_page_image(uploaded_file)
 
-    # Convert to RGB if necessary (handles RGBA, P mode, etc.)
-    if image.mode in ("RGBA", "P"):
-        # Create white background for transparency
-        background = Image.new("RGB", image.size, (255, 255, 255))
-        if image.mode == "P":
-            image = image.convert("RGBA")
-        background.paste(image, mask=image.split()[-1] if image.mode == "RGBA" else None)
-        image = background
-    elif image.mode != "RGB":
-        image = image.convert("RGB")
 
-    return image
+def ordered_map(fn, items: Iterable, workers: int, window: int | None = None, ctx=None) -> Iterator:
+    """
+    Like executor.map, but pulls items lazily: fn runs on `workers` threads
+    with at most `window` items (default 2 * workers) submitted ahead of the
+    consumer, so only a handful of pages are held in memory. Yields fn(item)
+    in input order; an exception from fn is raised when its result is reached.
+
+    Threads pay off for page work because PIL releases the GIL while
+    decoding, resampling and compressing, and the Gemini calls wait on I/O.
+    Pass ctx (a Streamlit ScriptRunContext) when fn needs st.session_state
+    or st.cache_* on the worker threads.
+    """
+    if window is None:
+        window = 2 * workers
+
+    def attach_script_ctx():
+        add_script_run_ctx(threading.current_thread(), ctx)
+
+    items = iter(items)
+    initializer = attach_script_ctx if ctx is not None else None
+    with ThreadPoolExecutor(max_workers=workers, initializer=initializer) as executor:
+        pending = deque(executor.submit(fn, item) for item in itertools.islice(items, window))
+        while pending:
+            future = pending.popleft()
+            # Top up the window before waiting (no-op once items run out)
+            for item in itertools.islice(items, 1):
+                pending.append(executor.submit(fn, item))
+            yield future.result()
+
+
+def _decode_ahead(
+    items: Iterable,
+    decode,
+    name_of,
+    ahead: int,
+    keep_failed: bool = False,
+) -> Iterator[tuple[str, Image.Image | None]]:
+    """
+    Decode items on `ahead` worker threads, keeping `ahead` decodes running
+    ahead of the consumer.
+    Yields (name, image) in input order; failed decodes are logged and
+    skipped, or yielded as (name, None) with keep_failed so that positions
+    in the output match positions in the input.
+    """
+    def decode_named(item) -> tuple[str, Image.Image | None]:
+        try:
+            return name_of(item), decode(item)
+        except Exception as e:
+            logger.warning(f"Failed to extract {name_of(item)}: {e}")
+            return name_of(item), None
+
+    for name, image in ordered_map(decode_named, items, workers=ahead, window=ahead):
+        if image is not None or keep_failed:
+            yield (name, image)
+
+
+def stream_images_from_uploads(
+    files: Iterable,
+    ahead: int = UPLOAD_DECODE_AHEAD,
+    keep_failed: bool = False,
+) -> Iterator[tuple[str, Image.Image | None]]:
+    """
+    Generator that yields (filename, PIL Image) for uploaded files in order,
+    decoding the next `ahead` files in the background while the current one is used.
+    With keep_failed, files that fail to decode are yielded as (filename, None).
+    """
+    yield from _decode_ahead(
+        files,
+        load_image_from_upload,
+        name_of=lambda f: f.name,
+        ahead=ahead,
+        keep_failed=keep_failed,
+    )
+
+
+def _is_hidden_zip_entry(info: zipfile.ZipInfo) -> bool:
+    """True for directories and macOS/dotfile metadata entries."""
+    name = info.filename
+    return info.is_dir() or name.startswith("__MACOSX") or "/." in name
+
+
+def _is_image_zip_entry(info: zipfile.ZipInfo) -> bool:
+    """True for ZIP entries that look like page images."""
+    return not _is_hidden_zip_entry(info) and info.filename.lower().endswith(_IMAGE_EXTENSIONS)
 
 
-def stream_images_from_zip(zip_file: BinaryIO):
+def stream_images_from_zip(zip_file: BinaryIO, skip: int = 0, keep_failed: bool = False):
     """
     Generator that yields images from a ZIP file ONE AT A TIME.
-    Memory-efficient alternative to extract_images_from_zip.
+    Only the next ZIP_DECODE_WORKERS pages are read and decoded ahead of
+    the consumer.
 
     Args:
         zip_file: A file-like object containing the ZIP data
+        skip: Number of leading images to skip (they are never read or decoded)
+        keep_failed: Yield (filename, None) for entries that fail to decode
+            instead of dropping them, so skip counts stay aligned on resume
 
     Yields:
         (filename, PIL Image) tuples, sorted naturally by filename
     """
     logger.info(f"Starting streaming ZIP extraction from: {getattr(zip_file, 'name', 'unknown')}")
-    valid_extensions = {".png", ".jpg", ".jpeg", ".webp"}
-
     try:
         with zipfile.ZipFile(zip_file, "r") as zf:
-            file_list = zf.namelist()
-            logger.info(f"ZIP contains {len(file_list)} entries")
-
-            # Filter and sort filenames first (cheap operation)
-            image_files = []
-            for name in file_list:
-                # Skip directories and hidden files
-                if name.endswith("/") or name.startswith("__MACOSX") or "/." in name:
-                    continue
-                ext = Path(name).suffix.lower()
-                if ext in valid_extensions:
-                    image_files.append(name)
-
-            # Sort naturally
-            image_files = sort_files_naturally(image_files)
-            logger.info(f"Found {len(image_files)} valid image files to stream")
-
-            # Yield one image at a time
-            for name in image_files:
-                try:
-                    logger.debug(f"Streaming: {name}")
-                    with zf.open(name) as img_file:
-                        img_data = io.BytesIO(img_file.read())
-                        image = Image.open(img_data)
-                        image.load()  # Force load to catch errors
-
-                        # Convert to RGB if necessary
-                        if image.mode in ("RGBA", "P"):
-                            background = Image.new("RGB", image.size, (255, 255, 255))
-                            if image.mode == "P":
-                                image = image.convert("RGBA")
-                            background.paste(image, mask=image.split()[-1] if image.mode == "RGBA" else None)
-                            image = background
-                        elif image.mode != "RGB":
-                            image = image.convert("RGB")
-
-                        clean_name = Path(name).name
-                        yield (clean_name, image)
-
-                except Exception as e:
-                    logger.warning(f"Failed to extract {name}: {e}")
-                    continue
+            entries = zf.infolist()
+            logger.info(f"ZIP contains {len(entries)} entries")
+
+            # Filter and sort entries first (cheap operation, central directory only)
+            image_entries = [info for info in entries if _is_image_zip_entry(info)]
+            image_entries = sort_files_naturally(image_entries, name_of=lambda info: info.filename)
+            logger.info(f"Found {len(image_entries)} valid image files to stream")
+
+            def read_entries() -> Iterator[tuple[str, bytes | None, str | None]]:
+                # Runs on the consumer's thread (the decode pool pulls items
+                # from there): ZipFile reads share one file handle, so they
+                # must not happen on several threads at once
+                for info in itertools.islice(image_entries, skip, None):
+                    logger.debug("Streaming: %s", info.filename)
+                    try:
+                        yield Path(info.filename).name, zf.read(info), None
+                    except Exception as e:
+                        yield Path(info.filename).name, None, str(e)
+
+            def decode_entry(entry: tuple[str, bytes | None, str | None]) -> Image.Image:
+                _, data, error = entry
+                if data is None:
+                    raise ValueError(f"Could not read entry: {error}")
+                return _decode_page_image(io.BytesIO(data))
+
+            yield from _decode_ahead(
+                read_entries(),
+                decode_entry,
+                name_of=lambda entry: entry[0],
+                ahead=ZIP_DECODE_WORKERS,
+                keep_failed=keep_failed,
+            )
 
     except zipfile.BadZipFile as e:
         logger.error(f"Invalid ZIP file: {e}")
@@ -281,19 +457,11 @@ def count_images_in_zip(zip_file: BinaryIO) -> tuple[int, list[str]]:
     Count valid images in a ZIP file without loading them.
     Returns (count, sorted_filenames).
     """
-    valid_extensions = {".png", ".jpg", ".jpeg", ".webp"}
-    image_files = []
-
     try:
         # Reset file position
         zip_file.seek(0)
         with zipfile.ZipFile(zip_file, "r") as zf:
-            for name in zf.namelist():
-                if name.endswith("/") or name.startswith("__MACOSX") or "/." in name:
-                    continue
-                ext = Path(name).suffix.lower()
-                if ext in valid_extensions:
-                    image_files.append(name)
+            image_files = [info.filename for info in zf.infolist() if _is_image_zip_entry(info)]
 
         sorted_names = sort_files_naturally(image_files)
         # Reset for later reading
@@ -304,113 +472,6 @@ def count_images_in_zip(zip_file: BinaryIO) -> tuple[int, list[str]]:
         raise ValueError(f"Invalid ZIP file: {e}")
 
 
-def extract_images_from_zip(zip_file: BinaryIO) -> list[tuple[str, Image.Image]]:
-    """
-    Extract all valid images from a ZIP file.
-
-    Args:
-        zip_file: A file-like object containing the ZIP data
-
-    Returns:
-        List of (filename, PIL Image) tuples, sorted naturally by filename
-    """
-    logger.info(f"Starting ZIP extraction from: {getattr(zip_file, 'name', 'unknown')}")
-    images = []
-    valid_extensions = {".png", ".jpg", ".jpeg", ".webp"}
-    skipped_files = []
-    error_files = []
-
-    try:
-        with zipfile.ZipFile(zip_file, "r") as zf:
-            file_list = zf.namelist()
-            logger.info(f"ZIP contains {len(file_list)} entries")
-
-            for name in file_list:
-                # Skip directories and hidden files
-                if name.endswith("/") or name.startswith("__MACOSX") or "/." in name:
-                    skipped_files.append((name, "directory or hidden file"))
-                    continue
-
-                # Check file extension
-                ext = Path(name).suffix.lower()
-                if ext not in valid_extensions:
-                    skipped_files.append((name, f"invalid extension: {ext}"))
-                    continue
-
-                try:
-                    # Extract and load image
-                    logger.debug(f"Extracting: {name}")
-                    with zf.open(name) as img_file:
-                        img_data = io.BytesIO(img_file.read())
-                        image = Image.open(img_data)
-                        # Force load the image data to catch any deferred errors
-                        image.load()
-
-                        logger.debug(f"Image {name}: mode={image.mode}, size={image.size}")
-
-                        # Convert to RGB if necessary
-                        if image.mode in ("RGBA", "P"):
-                            background = Image.new("RGB", image.size, (255, 255, 255))
-                            if image.mode == "P":
-                                image = image.convert("RGBA")
-                            background.paste(image, mask=image.split()[-1] if image.mode == "RGBA" else None)
-                            image = background
-                        elif image.mode != "RGB":
-                            image = image.convert("RGB")
-
-                        # Use just the filename, not the full path in zip
-                        clean_name = Path(name).name
-                        images.append((clean_name, image))
-                        logger.debug(f"Successfully extracted: {clean_name}")
-
-                except Exception as e:
-                    error_files.append((name, str(e)))
-                    logger.warning(f"Failed to extract {name}: {e}")
-                    continue
-
-        logger.info(f"ZIP extraction complete: {len(images)} images extracted, {len(skipped_files)} skipped, {len(error_files)} errors")
-
-        if error_files:
-            logger.warning(f"Files with errors: {error_files[:5]}...")  # Log first 5
-
-        # Sort images naturally by filename
-        logger.debug("Sorting images naturally by filename")
-        images.sort(key=lambda x: sort_files_naturally([x[0]])[0])
-
-        logger.info(f"Returning {len(images)} sorted images")
-        return images
-
-    except zipfile.BadZipFile as e:
-        logger.error(f"Invalid ZIP file: {e}")
-        raise ValueError(f"Invalid ZIP file: {e}")
-    except Exception as e:
-        logger.error(f"Unexpected error during ZIP extraction: {e}", exc_info=True)
-        raise
-
-
-def create_zip_in_memory(images: list[tuple[str, Image.Image]]) -> bytes:
-    """
-    Create ZIP file in memory from list of (filename, PIL Image) tuples.
-    Returns the ZIP file as bytes.
-    """
-    zip_buffer = io.BytesIO()
-
-    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
-        for filename, img in images:
-            # Ensure filename has proper extension
-            output_name = get_output_filename(filename)
-
-            # Save image to bytes
-            img_buffer = io.BytesIO()
-            img.save(img_buffer, format="PNG", optimize=True)
-            img_buffer.seek(0)
-
-            # Add to ZIP
-            zf.writestr(output_name, img_buffer.getvalue())
-
-    return zip_buffer.getvalue()
-
-
 def get_output_filename(original_filename: str) -> str:
     """
     Generate output filename from original.
@@ -420,37 +481,51 @@ def get_output_filename(original_filename: str) -> str:
     return f"translated_{stem}.png"
 
 
+_SIZE_UNITS = ("B", "KB", "MB", "GB", "TB")
+
+
 def format_file_size(size_bytes: int) -> str:
     """Format file size in human-readable format."""
-    for unit in ["B", "KB", "MB", "GB"]:
-        if size_bytes < 1024:
-            return f"{size_bytes:.1f} {unit}"
-        size_bytes /= 1024
-    return f"{size_bytes:.1f} TB"
+    if size_bytes < 1024:
+        return f"{size_bytes:.1f} B"
+    # Each unit is 2**10 of the previous one, so the bit length picks the unit
+    unit = min((int(size_bytes).bit_length() - 1) // 10, len(_SIZE_UNITS) - 1)
+    return f"{size_bytes / (1 << (10 * unit)):.1f} {_SIZE_UNITS[unit]}"
 
 
-def sort_files_naturally(filenames: list[str]) -> list[str]:
+@functools.lru_cache(maxsize=4096)
+def natural_sort_key(filename: str) -> tuple:
     """
-    Sort filenames naturally (page_2 before page_10).
+    Sort key that orders filenames naturally (page_2 before page_10).
+    Cached because the same filenames are re-sorted on every rerun.
     """
-    import re
+    return tuple(
+        int(text) if text.isdigit() else text.lower()
+        for text in _DIGITS_SPLIT(filename)
+    )
 
-    def natural_key(filename: str) -> list:
-        """Split filename into text and number parts for natural sorting."""
-        return [
-            int(text) if text.isdigit() else text.lower()
-            for text in re.split(r"(\d+)", filename)
-        ]
 
-    return sorted(filenames, key=natural_key)
+def sort_files_naturally(files: Iterable, name_of=None) -> list:
+    """
+    Sort filenames naturally (page_2 before page_10), in one pass.
+    Pass name_of to sort other objects (uploads, (name, image) tuples) by
+    the filename it returns. Each name's key is computed once.
+    """
+    if name_of is None:
+        return sorted(files, key=natural_sort_key)
+    return sorted(files, key=lambda item: natural_sort_key(name_of(item)))
 
 
-def estimate_processing_time(num_pages: int) -> str:
+def estimate_processing_time(num_pages: int, seconds_per_page: float | None = None) -> str:
     """
     Estimate processing time based on number of pages.
-    Rough estimate: ~10-15 seconds per page for extraction + editing.
+    Rough estimate: ~10-15 seconds per page for extraction + editing, with
+    MAX_CONCURRENT_PAGES pages in flight. Pass seconds_per_page (measured
+    from a previous run) to use the observed rate instead.
     """
-    seconds = num_pages * 12  # Average estimate
+    if seconds_per_page is None:
+        seconds_per_page = ESTIMATED_SECONDS_PER_PAGE / MAX_CONCURRENT_PAGES
+    seconds = int(num_pages * seconds_per_page)
 
     if seconds < 60:
         return f"~{seconds} seconds"
@@ -474,11 +549,9 @@ def validate_uploaded_files(files: list) -> tuple[bool, str]:
     if len(files) > 500:
         return False, "Maximum 500 pages allowed per upload"
 
-    valid_extensions = {".png", ".jpg", ".jpeg", ".webp"}
-
+    # Same suffix check as ZIP entries; no Path object per file
     for f in files:
-        ext = Path(f.name).suffix.lower()
-        if ext not in valid_extensions:
+        if not f.name.lower().endswith(_IMAGE_EXTENSIONS):
             return False, f"Invalid file type: {f.name}. Allowed: PNG, JPG, WEBP"
 
     return True, ""
@@ -501,11 +574,16 @@ def create_preview_grid(images: list[Image.Image], max_cols: int = 4, thumb_size
     grid_height = num_rows * thumb_size
     grid = Image.new("RGB", (grid_width, grid_height), (255, 255, 255))
 
-    for i, img in enumerate(images[:num_images]):
-        # Create thumbnail
-        thumb = img.copy()
-        thumb.thumbnail((thumb_size, thumb_size), Image.Resampling.LANCZOS)
+    def make_thumb(img: Image.Image) -> Image.Image:
+        # Resample straight from the original (no full-size copy)
+        scale = min(thumb_size / img.width, thumb_size / img.height, 1)
+        thumb_dims = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+        return img.resize(thumb_dims, Image.Resampling.LANCZOS)
+
+    # Create thumbnails on worker threads
+    thumbs = list(ordered_map(make_thumb, images[:num_images], workers=min(num_images, os.cpu_count() or 1)))
 
+    for i, thumb in enumerate(thumbs):
         # Calculate position
         row = i // num_cols
         col = i % num_cols
@@ -531,44 +609,141 @@ class TempResultStorage:
     def __init__(self):
         self.temp_dir = tempfile.mkdtemp(prefix="book_translator_")
         self.results: list[tuple[str, str]] = []  # (original_filename, temp_path)
+        # PNG encoding runs here so the translation loop doesn't wait on it
+        self._writer = ThreadPoolExecutor(max_workers=RESULT_WRITER_THREADS)
+        self._pending_writes: deque = deque()
+        self._write_futures: list[Future] = []  # One per entry in results
+        # (original_filename, error) for results whose PNG could not be written
+        self.failed_writes: list[tuple[str, str]] = []
+        self._failures_reported = 0
+        # The download ZIP is appended to on its own thread as results come in
+        self.zip_path = os.path.join(self.temp_dir, "translated_book.zip")
+        self._zipper = ThreadPoolExecutor(max_workers=1)
+        self._zipped_count = 0  # Results already in the ZIP (zipper thread only)
+        self._zip: zipfile.ZipFile | None = None  # Kept open between updates (zipper thread only)
         logger.info(f"Created temp directory: {self.temp_dir}")
 
     def save_result(self, filename: str, image: Image.Image) -> str:
         """
         Save a translated image to temp storage.
-        Returns the temp file path.
+        The write happens on a background thread; call flush() before
+        reading the files back. Returns the temp file path.
         """
         output_name = get_output_filename(filename)
         temp_path = os.path.join(self.temp_dir, output_name)
 
-        # Save as PNG
-        image.save(temp_path, format="PNG", optimize=True)
+        future = self._writer.submit(self._write_png, filename, image, temp_path)
         self.results.append((filename, temp_path))
+        self._write_futures.append(future)
+        self._pending_writes.append(future)
+
+        # Backpressure: don't let unwritten images pile up in memory
+        while len(self._pending_writes) > MAX_PENDING_RESULT_WRITES:
+            self._pending_writes.popleft().result()
 
-        logger.debug(f"Saved result to temp: {temp_path}")
         return temp_path
 
+    def _write_png(self, filename: str, image: Image.Image, temp_path: str) -> None:
+        """Encode one result to disk (runs on the writer thread)."""
+        try:
+            # Save as PNG - already DEFLATE-compressed, so files are kept as-is
+            # (a second compression pass on top would not shrink them)
+            image.save(temp_path, format="PNG", compress_level=RESULT_PNG_COMPRESS_LEVEL)
+            logger.debug("Saved result to temp: %s", temp_path)
+        except Exception as e:
+            # Readers skip missing files, so drop any partial output
+            logger.error(f"Failed to save result {temp_path}: {e}")
+            self.failed_writes.append((filename, f"Could not save translated page: {e}"))
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def flush(self) -> None:
+        """Wait for all queued result writes to finish."""
+        while self._pending_writes:
+            self._pending_writes.popleft().result()
+
     def get_result_count(self) -> int:
-        """Return number of saved results."""
-        return len(self.results)
+        """
+        Return number of saved results. Writes still queued count as saved;
+        call flush() first for an exact count.
+        """
+        return len(self.results) - len(self.failed_writes)
 
-    def create_zip(self) -> bytes:
+    def pop_new_failures(self) -> list[tuple[str, str]]:
         """
-        Create a ZIP file from all saved results.
-        Streams from disk to avoid loading all images into memory.
+        Return (original_filename, error) for writes that failed since the
+        last call, so the caller can report them (e.g. through log_error).
         """
-        zip_buffer = io.BytesIO()
+        new = self.failed_writes[self._failures_reported:]
+        self._failures_reported += len(new)
+        return new
 
-        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
-            for original_filename, temp_path in self.results:
+    def update_zip(self) -> Future:
+        """
+        Start adding results saved since the last update to the download ZIP,
+        in the background. Calling this as results come in leaves little
+        left to do when create_zip is called at the end.
+        """
+        return self._zipper.submit(self._append_to_zip, len(self.results))
+
+    def _append_to_zip(self, end: int) -> None:
+        """Append results[_zipped_count:end] to the ZIP (runs on the zipper thread)."""
+        if self._zipped_count == end and self._zip is None and os.path.exists(self.zip_path):
+            return  # Already complete
+
+        try:
+            if self._zip is None:
+                # One ZipFile stays open across updates: reopening in "a" mode
+                # would re-read the growing central directory every time.
+                # Results are PNGs (already compressed), so store them as-is
+                mode = "a" if self._zipped_count else "w"
+                self._zip = zipfile.ZipFile(self.zip_path, mode, zipfile.ZIP_STORED, allowZip64=True)
+            for i in range(self._zipped_count, end):
+                original_filename, temp_path = self.results[i]
+                self._write_futures[i].result()
                 if os.path.exists(temp_path):
                     output_name = get_output_filename(original_filename)
-                    zf.write(temp_path, output_name)
-
-        return zip_buffer.getvalue()
+                    self._zip.write(temp_path, output_name)
+                self._zipped_count = i + 1
+        except Exception:
+            self._discard_zip()
+            raise
+
+    def _close_zip(self) -> None:
+        """Write the ZIP's central directory so it can be read (runs on the zipper thread)."""
+        if self._zip is None:
+            return
+        zf, self._zip = self._zip, None
+        try:
+            zf.close()
+        except Exception:
+            self._discard_zip()
+            raise
+
+    def _discard_zip(self) -> None:
+        """Start over on the next update rather than append to a damaged file."""
+        if self._zip is not None:
+            try:
+                self._zip.close()
+            except Exception:
+                pass
+            self._zip = None
+        self._zipped_count = 0
+
+    def create_zip(self) -> str:
+        """
+        Create a ZIP file from all saved results and return its path.
+        Streams from disk to avoid loading all images into memory; only
+        results not yet added by update_zip are written, then the ZIP is
+        closed (a later update reopens it for appending).
+        """
+        self.update_zip().result()
+        self._zipper.submit(self._close_zip).result()
+        return self.zip_path
 
     def load_result_for_preview(self, index: int) -> tuple[str, Image.Image] | None:
         """Load a single result for preview (temporary load)."""
+        self.flush()
         if 0 <= index < len(self.results):
             filename, temp_path = self.results[index]
             if os.path.exists(temp_path):
@@ -586,6 +761,9 @@ class TempResultStorage:
 
     def cleanup(self):
         """Remove temp directory and all files."""
+        self._writer.shutdown(wait=True)
+        self._zipper.shutdown(wait=True)
+        self._discard_zip()  # The zipper thread is done, so this thread can close it
         if os.path.exists(self.temp_dir):
             shutil.rmtree(self.temp_dir)
             logger.info(f"Cleaned up temp directory: {self.temp_dir}")
@@ -596,3 +774,207 @@ class TempResultStorage:
             self.cleanup()
         except Exception:
             pass
+
+
+def _page_sort_key(page: tuple[str, str]) -> tuple:
+    return natural_sort_key(page[0])
+
+
+class TempPageStorage:
+    """
+    Holds source pages (chunked uploads, batch job inputs) on disk instead
+    of as decoded images in session state. Pages are only decoded when
+    they are actually used.
+    """
+
+    def __init__(self):
+        self.temp_dir: str | None = None
+        self.pages: list[tuple[str, str]] = []  # (original_filename, temp_path)
+        self._thumbnails: dict[str, bytes] = {}  # temp_path -> WEBP preview bytes
+
+    def _ensure_dir(self) -> str:
+        if self.temp_dir is None:
+            self.temp_dir = tempfile.mkdtemp(prefix="book_translator_pages_")
+            logger.info(f"Created temp directory: {self.temp_dir}")
+        return self.temp_dir
+
+    def add_uploads(self, files: Iterable) -> None:
+        """Copy uploaded files to disk and keep the pages naturally sorted."""
+        self._ensure_dir()
+        for f in files:
+            suffix = os.path.splitext(f.name)[1]
+            fd, temp_path = tempfile.mkstemp(dir=self.temp_dir, suffix=suffix)
+            f.seek(0)
+            with os.fdopen(fd, "wb") as out:
+                shutil.copyfileobj(f, out, length=1 << 20)  # 1 MiB blocks, not 64 KiB
+            # Insert in natural order instead of re-sorting the whole queue
+            bisect.insort(self.pages, (f.name, temp_path), key=_page_sort_key)
+
+    def add_images(self, images: Iterable[tuple[str, Image.Image]]) -> None:
+        """Save already-decoded (filename, PIL Image) pages as PNGs, in the given order."""
+        temp_dir = self._ensure_dir()
+        for filename, image in images:
+            fd, temp_path = tempfile.mkstemp(dir=temp_dir, suffix=".png")
+            with os.fdopen(fd, "wb") as out:
+                image.save(out, format="PNG", compress_level=SCRATCH_PNG_COMPRESS_LEVEL)
+            self.pages.append((filename, temp_path))
+
+    def __len__(self) -> int:
+        return len(self.pages)
+
+    def stream_images(
+        self,
+        start: int = 0,
+        ahead: int = UPLOAD_DECODE_AHEAD,
+        keep_failed: bool = False,
+    ) -> Iterator[tuple[str, Image.Image | None]]:
+        """
+        Yield (filename, PIL Image) from page `start` on, decoding `ahead` pages ahead.
+        With keep_failed, pages that fail to decode are yielded as (filename, None).
+        """
+        yield from _decode_ahead(
+            itertools.islice(self.pages, start, None),
+            lambda page: _decode_page_image(page[1]),
+            name_of=lambda page: page[0],
+            ahead=ahead,
+            keep_failed=keep_failed,
+        )
+
+    def get_thumbnail(self, index: int) -> tuple[str, bytes]:
+        """
+        Return (filename, WEBP thumbnail bytes) for previewing a page.
+        Each thumbnail is encoded once, so reruns send a few KB per page
+        instead of the full-size upload.
+        """
+        filename, temp_path = self.pages[index]
+        thumbnail = self._thumbnails.get(temp_path)
+        if thumbnail is None:
+            image = _decode_page_image(temp_path)
+            image.thumbnail(PREVIEW_THUMB_SIZE)
+            buffer = io.BytesIO()
+            image.save(buffer, format="WEBP", quality=75)
+            thumbnail = self._thumbnails[temp_path] = buffer.getvalue()
+        return filename, thumbnail
+
+    def cleanup(self):
+        """Remove temp directory and all files."""
+        self.pages = []
+        self._thumbnails = {}
+        if self.temp_dir and os.path.exists(self.temp_dir):
+            shutil.rmtree(self.temp_dir)
+            logger.info(f"Cleaned up temp directory: {self.temp_dir}")
+        self.temp_dir = None
+
+    def __del__(self):
+        """Cleanup on garbage collection."""
+        try:
+            self.cleanup()
+        except Exception:
+            pass
+
+
+def image_content_hash(image: Image.Image) -> str:
+    """Hash of an image's pixels, mode and size (same picture -> same hash)."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{image.mode}{image.size}".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+class PageResultCache:
+    """
+    Disk cache of translated pages for one session, keyed by the source
+    image's content plus everything that shapes the result (models, prompts,
+    verification), so a reloaded run skips pages it already translated
+    instead of paying for the API calls again.
+
+    Each entry is the translated PNG plus a JSON sidecar with the page's
+    extraction and verification, so cache hits can still be recorded in the
+    pages database. Bounded to max_bytes, evicting least recently used pages.
+    """
+
+    def __init__(self, max_bytes: int = PAGE_CACHE_MAX_BYTES):
+        self.cache_dir = tempfile.mkdtemp(prefix="book_translator_cache_")
+        self.max_bytes = max_bytes
+        self._sizes: OrderedDict[str, int] = OrderedDict()  # key -> bytes on disk, oldest first
+        self._total = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def page_key(image_hash: str, *context: str) -> str:
+        """Key for a page (see image_content_hash) processed under the given context strings."""
+        digest = hashlib.blake2b(image_hash.encode(), digest_size=16)
+        for part in context:
+            digest.update(b"\0" + part.encode())
+        return digest.hexdigest()
+
+    def _path(self, key: str, ext: str = ".png") -> str:
+        return os.path.join(self.cache_dir, key + ext)
+
+    def get(self, key: str) -> tuple[Image.Image, dict] | None:
+        """Load a cached (translated page, metadata) pair, or None on a miss."""
+        with self._lock:
+            if key not in self._sizes:
+                return None
+            self._sizes.move_to_end(key)  # Recently used - evicted last
+        try:
+            with open(self._path(key, ".json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            with Image.open(self._path(key), formats=("PNG",)) as image:
+                image.load()
+                return image.copy(), meta
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable cache entry {key}: {e}")
+            return None
+
+    def put(self, key: str, image: Image.Image, meta: dict) -> None:
+        """
+        Store a translated page and its JSON-serializable metadata.
+        The image is written to a temp name, then renamed, so readers never
+        see a partial file; the sidecar is in place before the entry is listed.
+        """
+        with open(self._path(key, ".json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                image.save(f, format="PNG", compress_level=SCRATCH_PNG_COMPRESS_LEVEL)
+            os.replace(tmp_path, self._path(key))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        size = os.path.getsize(self._path(key)) + os.path.getsize(self._path(key, ".json"))
+
+        with self._lock:
+            self._total += size - self._sizes.pop(key, 0)
+            self._sizes[key] = size
+            # Evict least recently used pages until the cache fits
+            evicted = []
+            while self._total > self.max_bytes and self._sizes:
+                old_key, old_size = self._sizes.popitem(last=False)
+                self._total -= old_size
+                evicted.append(old_key)
+        for old_key in evicted:
+            for ext in (".png", ".json"):
+                try:
+                    os.remove(self._path(old_key, ext))
+                except FileNotFoundError:
+                    pass
+
+    def cleanup(self):
+        """Remove the cache directory and all cached pages."""
+        with self._lock:
+            self._sizes.clear()
+            self._total = 0
+        if self.cache_dir and os.path.exists(self.cache_dir):
+            shutil.rmtree(self.cache_dir)
+            logger.info(f"Cleaned up page cache: {self.cache_dir}")
+        self.cache_dir = None
+
+    def __del__(self):
+        """Cleanup on garbage collection."""
+        try:
+            self.cleanup()
+        except Exception:
+            pass